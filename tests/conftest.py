@@ -0,0 +1,27 @@
+# tests/conftest.py
+import shutil
+from pathlib import Path
+
+import pytest
+
+from valutatrade_hub.core import usecases
+
+REPO_DATA = Path(__file__).resolve().parent.parent / "data"
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Рабочий каталог с копией справочных данных (валюты, курсы) и пустыми шардами"""
+    (tmp_path / "data").mkdir()
+    for name in ("currencies.json", "rates.json"):
+        shutil.copy(REPO_DATA / name, tmp_path / "data" / name)
+    monkeypatch.chdir(tmp_path)
+    for name in ("_shard_store", "_quote_cache", "_valuation_cache", "_shared_reader"):
+        monkeypatch.setattr(usecases, name, None)
+    monkeypatch.setattr(usecases, "_portfolio_versions", {})
+    return tmp_path / "data"
+
+
+@pytest.fixture
+def user_id(data_dir):
+    return usecases.register_user("alice", "secret1")["user_id"]
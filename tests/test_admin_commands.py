@@ -0,0 +1,28 @@
+# tests/test_admin_commands.py
+import pytest
+
+from valutatrade_hub.cli import interface
+from valutatrade_hub.core import usecases
+from valutatrade_hub.infra.settings import SettingsLoader
+
+
+@pytest.fixture
+def admin(user_id, monkeypatch):
+    usecases.register_user("root", "secret1")
+    monkeypatch.setattr(SettingsLoader(), "ADMIN_USERS", ("root",))
+    return usecases.login_user("root", "secret1")
+
+
+@pytest.mark.parametrize("command", [
+    lambda: interface.cmd_dashboard_simple("USD"),
+    lambda: interface.cmd_pnl_report_simple("fifo"),
+    lambda: interface.cmd_convert_data_simple("json", []),
+])
+def test_cross_user_commands_require_admin(command, admin, monkeypatch, capsys):
+    monkeypatch.setattr(interface, "CURRENT_USER", usecases.login_user("alice", "secret1"))
+    command()
+    assert "только администраторам" in capsys.readouterr().out
+
+    monkeypatch.setattr(interface, "CURRENT_USER", admin)
+    command()
+    assert "только администраторам" not in capsys.readouterr().out
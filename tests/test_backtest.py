@@ -0,0 +1,24 @@
+# tests/test_backtest.py
+from valutatrade_hub.core.backtest import SimPortfolio
+
+SCALES = {"USD": 2, "BTC": 8}
+
+
+def test_sim_trades_round_usd_against_the_user():
+    portfolio = SimPortfolio(100.0, SCALES)
+    # 0.001 BTC по 1 USD = 0.00003 BTC стоит 33.333… USD — списывается 33.34
+    assert portfolio.buy("BTC", 0.001, 0.00003)
+    assert portfolio.cash_minor == 10000 - 3334
+    assert portfolio.holdings["BTC"] == 100000
+    # продажа обратно приносит 33.33 — округление вниз
+    assert portfolio.sell("BTC", 0.001, 0.00003)
+    assert portfolio.cash_minor == 10000 - 3334 + 3333
+    assert portfolio.amount("BTC") == 0
+
+
+def test_sim_rejects_dust_and_overdraft():
+    portfolio = SimPortfolio(1.0, SCALES)
+    assert not portfolio.buy("BTC", 1e-9, 0.00003)  # меньше сатоши
+    assert not portfolio.buy("BTC", 1.0, 0.00003)  # дороже наличных
+    assert not portfolio.sell("BTC", 0.1, 0.00003)  # нечего продавать
+    assert portfolio.trades == 0 and portfolio.cash_minor == 100
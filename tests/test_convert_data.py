@@ -0,0 +1,24 @@
+# tests/test_convert_data.py
+import threading
+
+from valutatrade_hub.core import usecases
+
+
+def test_convert_data_rewrites_shards_and_keeps_users(user_id):
+    store = usecases._get_shard_store()
+    results = usecases.convert_data("json")
+    converted = {path for path, _, _ in results}
+    assert set(store.paths()) <= converted
+    assert usecases.login_user("alice", "secret1")["user_id"] == user_id
+
+
+def test_shard_conversion_waits_for_shard_writers(user_id):
+    store = usecases._get_shard_store()
+    done = threading.Event()
+    with store.user_shard(user_id, write=True):
+        worker = threading.Thread(target=lambda: (store.convert("json"), done.set()))
+        worker.start()
+        assert not done.wait(0.2)  # конвертация ждёт, пока шард заблокирован на запись
+    worker.join(5)
+    assert done.is_set()
+
@@ -0,0 +1,36 @@
+# tests/test_export.py
+import csv
+
+import pytest
+
+from valutatrade_hub.cli import interface
+from valutatrade_hub.core import usecases
+from valutatrade_hub.infra.settings import SettingsLoader
+
+
+@pytest.fixture
+def users(user_id, monkeypatch):
+    admin_id = usecases.register_user("root", "secret1")["user_id"]
+    monkeypatch.setattr(SettingsLoader(), "ADMIN_USERS", ("root",))
+    return {"alice": user_id, "root": admin_id}
+
+
+def _export(monkeypatch, out, username, *args):
+    """Выгрузка кошельков от имени username; user_id из файла или None, если выгрузки не было"""
+    monkeypatch.setattr(interface, "CURRENT_USER", usecases.login_user(username, "secret1"))
+    interface.cmd_export_simple("wallets", ["--output", str(out), *args])
+    if not out.exists():
+        return None
+    with open(out, encoding="utf-8") as f:
+        return {row["user_id"] for row in csv.DictReader(f)}
+
+
+def test_user_exports_only_own_wallets(users, monkeypatch, tmp_path):
+    assert _export(monkeypatch, tmp_path / "own.csv", "alice") == {str(users["alice"])}
+    assert _export(monkeypatch, tmp_path / "other.csv", "alice", "--user", str(users["root"])) is None
+
+
+def test_admin_exports_all_or_one_user(users, monkeypatch, tmp_path):
+    assert _export(monkeypatch, tmp_path / "all.csv", "root") == {str(uid) for uid in users.values()}
+    one = _export(monkeypatch, tmp_path / "one.csv", "root", "--user", str(users["alice"]))
+    assert one == {str(users["alice"])}
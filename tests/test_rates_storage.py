@@ -0,0 +1,19 @@
+# tests/test_rates_storage.py
+from valutatrade_hub.parser_service.storage import RatesStorage
+
+
+def test_concurrent_instances_do_not_drop_each_others_snapshots(data_dir):
+    first, second = RatesStorage(), RatesStorage()
+    first.save_rates({"EUR_USD": {"rate": 1.1}})
+    second.save_rates({"EUR_USD": {"rate": 1.2}})  # манифест second устарел до записи
+    first.save_rates({"EUR_USD": {"rate": 1.3}})
+
+    snapshots = RatesStorage().get_range()
+    assert [s["EUR_USD"]["rate"] for s in snapshots.values()] == [1.1, 1.2, 1.3]
+
+
+def test_convert_format_keeps_segments_written_by_other_instance(data_dir):
+    stale = RatesStorage()
+    RatesStorage().save_rates({"EUR_USD": {"rate": 1.1}})
+    stale.convert_format("json")
+    assert len(RatesStorage().get_range()) == 1
@@ -0,0 +1,47 @@
+# tests/test_shared_rates.py
+import mmap
+import struct
+from datetime import datetime, timezone
+
+import pytest
+
+from valutatrade_hub.infra.shared_rates import SEQ_OFFSET, SharedRatesReader, SharedRatesWriter
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def table(tmp_path):
+    path = str(tmp_path / "rates.bin")
+    writer = SharedRatesWriter(path)
+    writer.publish([("USD", 1.0), ("EUR", 0.9)], NOW)
+    reader = SharedRatesReader(path)
+    yield path, writer, reader
+    reader.close()
+
+
+def test_failed_publish_keeps_seq_even(table):
+    _, writer, reader = table
+    with pytest.raises(TypeError):
+        writer.publish([("EUR", None)], NOW)
+    assert reader._seq() % 2 == 0
+    assert reader.lookup("EUR")[0] == 0.9
+
+
+def test_odd_seq_left_by_crashed_writer_does_not_hang(table):
+    path, writer, reader = table
+    with open(path, "r+b") as f, mmap.mmap(f.fileno(), 0) as mm:
+        struct.pack_into("<Q", mm, SEQ_OFFSET, reader._seq() + 1)
+    assert reader.lookup("EUR") is None  # читатель сдаётся, вызывающий уходит на rates.json
+    writer.publish([("EUR", 0.8)], NOW)
+    assert reader._seq() % 2 == 0
+    assert reader.lookup("EUR")[0] == 0.8
+
+
+def test_invalidate_hides_stale_rates_until_republished(table):
+    _, writer, reader = table
+    writer.invalidate()
+    assert reader.lookup("EUR") is None
+    writer.publish([("BTC", 1e-5)], NOW)
+    assert reader.lookup("BTC")[0] == 1e-5
+    assert reader.lookup("EUR") is None
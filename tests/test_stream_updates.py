@@ -0,0 +1,38 @@
+# tests/test_stream_updates.py
+import json
+
+from valutatrade_hub.infra import serialization
+from valutatrade_hub.parser_service.storage import RatesStorage
+from valutatrade_hub.parser_service.stream import parse_tick
+from valutatrade_hub.parser_service.updater import RatesUpdater
+
+
+def _pairs(data_dir):
+    return serialization.load(str(data_dir / "rates.json"), {})["pairs"]
+
+
+def test_parse_tick_rejects_non_finite_rates():
+    assert parse_tick(b'{"currency": "BTC", "rate": 1.6e-05}', "USD") == ("BTC", 1.6e-05)
+    assert parse_tick(b'{"currency": "BTC", "rate": Infinity}', "USD") is None
+    assert parse_tick(b'{"currency": "BTC", "rate": NaN}', "USD") is None
+    assert parse_tick(json.dumps({"pair": "USD_BTC", "rate": 1e308 * 10}).encode(), "USD") is None
+
+
+def test_concurrent_streams_keep_each_others_pairs(data_dir):
+    first, second = RatesUpdater(), RatesUpdater()
+    first.apply_ticks({"EUR": 0.5})
+    second.apply_ticks({"GBP": 0.25})
+    first.apply_ticks({"EUR": 0.6})  # first уже держал rates.json до записи second
+    pairs = _pairs(data_dir)
+    assert pairs["USD_EUR"]["rate"] == 0.6
+    assert pairs["USD_GBP"]["rate"] == 0.25
+
+
+def test_stream_snapshot_includes_rates_written_by_other_process(data_dir):
+    updater = RatesUpdater()
+    updater.apply_ticks({"EUR": 0.5})
+    RatesStorage().save_rates({"EUR": 0.5, "GBP": 0.3, "XYZ": 7.0})  # полное обновление в другом процессе
+    updater.apply_ticks({"EUR": 0.6})
+    latest = RatesStorage().get_latest_rates()
+    assert latest["EUR"] == 0.6
+    assert latest["XYZ"] == 7.0
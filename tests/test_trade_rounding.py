@@ -0,0 +1,91 @@
+# tests/test_trade_rounding.py
+import pytest
+
+from valutatrade_hub.core import usecases
+from valutatrade_hub.core.utils import buy_cost_minor, sell_revenue_minor
+
+BTC_PER_USD = 1 / 62500  # 1 USD = 0.000016 BTC
+USD_PER_BTC = 62500.0
+
+
+def usd_minor(user_id):
+    return usecases._get_portfolio(user_id).get_minor("USD")
+
+
+def btc_minor(user_id):
+    return usecases._get_portfolio(user_id).get_minor("BTC")
+
+
+@pytest.mark.parametrize("amount, rate, expected", [
+    (0.00000007, BTC_PER_USD, 1),  # 0.004375 USD -> 0.01
+    (0.001, 0.4, 1),               # 0.0025 USD -> 0.01
+    (3, 10, 30),
+    (0.3, 1, 30),
+    (1, 3, 34),                    # 0.333... USD -> 0.34
+])
+def test_buy_cost_rounds_up(amount, rate, expected):
+    assert buy_cost_minor(amount, rate, 2) == expected
+
+
+@pytest.mark.parametrize("amount, rate, expected", [
+    (0.00000008, USD_PER_BTC, 0),  # 0.005 USD -> 0.00
+    (0.001, 2.5, 0),
+    (3, 0.1, 30),                  # 3 * 0.1 в float даёт 0.30000000000000004
+    (2, 1 / 3, 66),
+])
+def test_sell_revenue_rounds_down(amount, rate, expected):
+    assert sell_revenue_minor(amount, rate, 2) == expected
+
+
+def test_non_positive_rate_rejected():
+    with pytest.raises(ValueError):
+        buy_cost_minor(1, 0, 2)
+    with pytest.raises(ValueError):
+        sell_revenue_minor(1, -1, 2)
+
+
+def test_tiny_buy_is_charged_at_least_one_cent(user_id):
+    before = usd_minor(user_id)
+    usecases.buy_currency(user_id, "BTC", 0.00000007, rate=BTC_PER_USD)
+    assert usd_minor(user_id) == before - 1
+    assert btc_minor(user_id) == 7
+
+
+def test_buy_at_stored_rate_is_not_free(user_id):
+    before = usd_minor(user_id)
+    usecases.buy_currency(user_id, "BTC", 0.001)  # в data/rates.json 1 USD = 0.4 BTC
+    assert usd_minor(user_id) == before - 1
+    assert usecases.get_pnl(user_id)[0]["cost"] == pytest.approx(0.01)
+
+
+def test_sell_below_one_cent_is_rejected(user_id):
+    usecases.buy_currency(user_id, "BTC", 0.00000008, rate=BTC_PER_USD)
+    usd_before, btc_before = usd_minor(user_id), btc_minor(user_id)
+    with pytest.raises(ValueError):
+        usecases.sell_currency(user_id, "BTC", 0.00000008, rate=USD_PER_BTC)
+    assert (usd_minor(user_id), btc_minor(user_id)) == (usd_before, btc_before)
+
+
+def test_round_trips_never_mint_usd(user_id):
+    start = usd_minor(user_id)
+    for _ in range(20):
+        usecases.buy_currency(user_id, "BTC", 0.00000017, rate=BTC_PER_USD)  # 0.010625 USD
+        usecases.sell_currency(user_id, "BTC", 0.00000017, rate=USD_PER_BTC)
+    assert btc_minor(user_id) == 0
+    assert usd_minor(user_id) <= start
+
+
+def test_quote_for_dust_amount_is_rejected(user_id):
+    with pytest.raises(ValueError):
+        usecases.create_quote(user_id, "sell", "BTC", 0.00000001)
+
+
+def test_dashboard_holdings_are_exact_minor_units(user_id):
+    other = usecases.register_user("bob", "secret2")["user_id"]
+    for uid in (user_id, other):
+        for _ in range(3):
+            usecases.buy_currency(uid, "BTC", 0.00000001, rate=BTC_PER_USD)
+    _, holdings, _ = usecases.portfolio_dashboard()
+    summary = {code: minor for code, minor, _ in holdings}
+    assert summary["BTC"] == 6
+    assert summary["USD"] == 2 * 1_000_000 - 6
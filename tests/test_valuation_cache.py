@@ -0,0 +1,43 @@
+# tests/test_valuation_cache.py
+import json
+
+from valutatrade_hub.core import usecases
+
+
+def stats():
+    return usecases._get_valuation_cache().stats()
+
+
+def set_usd_price(data_dir, currency, price):
+    path = data_dir / "rates.json"
+    rates = json.loads(path.read_text(encoding="utf-8"))
+    rates["pairs"][f"{currency}_USD"]["rate"] = price
+    path.write_text(json.dumps(rates), encoding="utf-8")
+
+
+def test_repeated_view_hits_without_reading_shard(user_id, monkeypatch):
+    first = usecases.portfolio_valuation(user_id)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("шард не должен читаться при попадании в кэш")
+
+    monkeypatch.setattr(usecases, "_read_portfolio", fail)
+    assert usecases.portfolio_valuation(user_id) == first
+    assert stats()["hits"] == 1
+
+
+def test_rates_file_change_invalidates(user_id, data_dir):
+    usecases.buy_currency(user_id, "EUR", 10)
+    before = usecases.portfolio_valuation(user_id)
+    set_usd_price(data_dir, "EUR", 20.0)
+    after = usecases.portfolio_valuation(user_id)
+    assert stats()["invalidations"] == 1
+    assert after.total > before.total
+
+
+def test_trade_by_same_user_invalidates(user_id):
+    before = usecases.portfolio_valuation(user_id)
+    usecases.buy_currency(user_id, "EUR", 10)
+    after = usecases.portfolio_valuation(user_id)
+    assert dict((c, b) for c, b, _ in after.rows)["EUR"] == 10
+    assert after != before
@@ -4,21 +4,51 @@ from valutatrade_hub.core.usecases import (
     register_user,
     login_user,
     show_portfolio,
+    show_portfolio_at,
+    show_portfolio_series,
     buy_currency,
     sell_currency,
+    create_quote,
+    execute_quote,
     get_rate,
+    get_pnl,
+    pnl_report,
+    run_backtests,
+    convert_data,
+    export_data,
+    portfolio_dashboard,
+    reshard,
+    is_admin,
+    get_history,
+    add_alert,
+    list_alerts,
+    remove_alert,
 )
 from valutatrade_hub.parser_service.updater import RatesUpdater  # ← ИСПРАВЛЕННЫЙ ИМПОРТ
+from valutatrade_hub.parser_service.stream import stream_rates
+from valutatrade_hub.core.utils import format_minor
 from valutatrade_hub.core.exceptions import (
     InsufficientFundsError,
     CurrencyNotFoundError,
     ApiRequestError,
+    QuoteError,
 )
 
 # Глобальная переменная для текущей сессии
 CURRENT_USER = None
 
 
+def _require_admin() -> bool:
+    """Проверка для служебных команд и сводок по всем пользователям"""
+    if not CURRENT_USER:
+        print("Сначала выполните login")
+        return False
+    if not is_admin(CURRENT_USER):
+        print("Ошибка: команда доступна только администраторам (VALUTATRADE_ADMINS)")
+        return False
+    return True
+
+
 def cmd_register_simple(username: str, password: str):
     """Регистрация пользователя (упрощенная версия)"""
     try:
@@ -50,6 +80,37 @@ def cmd_show_portfolio_simple(base: str = "USD"):
         print(e)
 
 
+def cmd_show_portfolio_history_simple(base: str = "USD", at: str = None,
+                                      start: str = None, end: str = None, step: str = "1d"):
+    """Стоимость портфеля на момент в прошлом или временной ряд"""
+    if not CURRENT_USER:
+        print("Сначала выполните login")
+        return
+    try:
+        if at:
+            show_portfolio_at(CURRENT_USER['user_id'], at, base_currency=base)
+        else:
+            show_portfolio_series(CURRENT_USER['user_id'], start, end, step, base_currency=base)
+    except (ValueError, CurrencyNotFoundError) as e:
+        print(f"Ошибка: {e}")
+
+
+def _parse_options(args: list) -> dict:
+    """Разбирает опции вида --key value и --key=value"""
+    options = {}
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg.startswith("--") and "=" in arg:
+            key, value = arg[2:].split("=", 1)
+            options[key] = value
+        elif arg.startswith("--") and i + 1 < len(args):
+            options[arg[2:]] = args[i + 1]
+            i += 1
+        i += 1
+    return options
+
+
 def cmd_buy_simple(currency: str, amount: float):
     """Покупка валюты (упрощенная версия)"""
     if not CURRENT_USER:
@@ -72,6 +133,34 @@ def cmd_sell_simple(currency: str, amount: float):
         print(f"Ошибка: {e}")
 
 
+def cmd_quote_simple(side: str, currency: str, amount: float, ttl: float = None):
+    """Котировка: курс сделки, зафиксированный на несколько секунд"""
+    if not CURRENT_USER:
+        print("Сначала выполните login")
+        return
+    try:
+        quote = create_quote(CURRENT_USER['user_id'], side, currency, amount, ttl)
+    except (ValueError, CurrencyNotFoundError, ApiRequestError) as e:
+        print(f"Ошибка: {e}")
+        return
+    action = "Покупка" if quote.side == "buy" else "Продажа"
+    print(f"Котировка {quote.quote_id}: {action} {quote.amount:.8g} {quote.currency} "
+          f"за {quote.usd_amount:.2f} USD (курс {quote.rate:.6g}), "
+          f"действует {quote.seconds_left():.0f} с")
+    print(f"Исполнить: {quote.side} --quote {quote.quote_id}")
+
+
+def cmd_execute_quote_simple(side: str, quote_id: str):
+    """Сделка по ранее выданной котировке"""
+    if not CURRENT_USER:
+        print("Сначала выполните login")
+        return
+    try:
+        execute_quote(CURRENT_USER['user_id'], quote_id, side)
+    except (QuoteError, ValueError, CurrencyNotFoundError, InsufficientFundsError) as e:
+        print(f"Ошибка: {e}")
+
+
 def cmd_get_rate_simple(from_currency: str, to_currency: str):
     """Получить курс валюты (упрощенная версия)"""
     try:
@@ -93,6 +182,260 @@ def cmd_update_rates_simple():
         print(f"Ошибка API: {e}")
 
 
+def cmd_stream_rates_simple(args: list):
+    """Потоковое обновление курсов из фида тиков"""
+    stub = "--stub" in args
+    options = _parse_options([a for a in args if a != "--stub"])
+    try:
+        window = float(options["window"]) if "window" in options else None
+        duration = float(options["duration"]) if "duration" in options else None
+        port = int(options["port"]) if "port" in options else None
+    except ValueError:
+        print("Ошибка: --window, --duration и --port должны быть числами")
+        return
+    print("📡 Потоковое обновление курсов (Ctrl+C — остановить)...")
+    try:
+        stats = stream_rates(options.get("host"), port, window, duration, stub=stub)
+    except ValueError as e:
+        print(f"Ошибка: {e}")
+        return
+    except OSError as e:
+        print(f"Ошибка подключения к фиду: {e}")
+        return
+    except KeyboardInterrupt:
+        print("Поток остановлен")
+        return
+    print(f"Тиков: {stats.received}, применено: {stats.applied}, объединено: {stats.coalesced}, "
+          f"пропущено: {stats.skipped}, обновлений: {stats.flushes}, пик очереди: {stats.max_queue}")
+
+
+def cmd_history_simple(options: dict):
+    """История сделок текущего пользователя"""
+    if not CURRENT_USER:
+        print("Сначала выполните login")
+        return
+    try:
+        trades, next_cursor = get_history(
+            CURRENT_USER['user_id'],
+            currency=options.get("currency"),
+            start=options.get("from"),
+            end=options.get("to"),
+            limit=int(options.get("limit", 50)),
+            cursor=options.get("cursor"),
+        )
+    except (ValueError, CurrencyNotFoundError) as e:
+        print(f"Ошибка: {e}")
+        return
+    if not trades:
+        print("Сделок нет")
+        return
+    for t in trades:
+        action = "BUY " if t["side"] == "buy" else "SELL"
+        print(f"{t['timestamp']} {action} {t['amount']:.8g} {t['currency']} по {t['rate']:.6g} "
+              f"({t['pair']}), {t['usd_amount']:.2f} USD [{t['trade_id']}]")
+    if next_cursor:
+        print(f"Следующая страница: history --cursor {next_cursor}")
+
+
+def cmd_pnl_simple(method: str = "fifo"):
+    """P&L текущего пользователя"""
+    if not CURRENT_USER:
+        print("Сначала выполните login")
+        return
+    try:
+        rows = get_pnl(CURRENT_USER['user_id'], method)
+    except ValueError as e:
+        print(f"Ошибка: {e}")
+        return
+    if not rows:
+        print("Нет сделок для расчёта P&L")
+        return
+    print(f"\nP&L ({method}, USD):")
+    print("-" * 60)
+    for row in rows:
+        unrealized = f"{row['unrealized']:.2f}" if row['unrealized'] is not None else "нет курса"
+        twr = f"{row['twr'] * 100:.2f}%" if row['twr'] is not None else "-"
+        print(f"{row['currency']}: кол-во {row['quantity']:.4f}, себестоимость {row['cost']:.2f}, "
+              f"реализ. {row['realized']:.2f}, нереализ. {unrealized}, TWR {twr}")
+    print("-" * 60)
+
+
+def cmd_pnl_report_simple(method: str = "fifo"):
+    """Сводный P&L по всем пользователям (только для администраторов)"""
+    if not _require_admin():
+        return
+    try:
+        report = pnl_report(method)
+    except ValueError as e:
+        print(f"Ошибка: {e}")
+        return
+    print(f"\nP&L по пользователям ({method}, USD):")
+    print("-" * 60)
+    for entry in report:
+        print(f"user {entry['user_id']}: реализ. {entry['realized']:.2f}, нереализ. {entry['unrealized']:.2f}")
+    print("-" * 60)
+
+
+def _parse_strategy_params(args: list) -> dict:
+    """key=value; списки через запятую, веса как BTC:0.5,ETH:0.3"""
+    params = {}
+    for arg in args:
+        if "=" not in arg:
+            raise ValueError(f"Параметр '{arg}' должен иметь вид key=value")
+        key, value = arg.split("=", 1)
+        if ":" in value:
+            params[key] = {k.upper(): float(v) for k, v in (item.split(":") for item in value.split(","))}
+        elif "," in value or key == "targets":
+            params[key] = tuple(v.upper() for v in value.split(","))
+        else:
+            params[key] = float(value)
+    return params
+
+
+def cmd_backtest_simple(strategy: str, args: list):
+    """Бэктест стратегии по истории курсов"""
+    try:
+        params = _parse_strategy_params(args)
+        result = run_backtests([(strategy, params)])[0]
+    except (ValueError, CurrencyNotFoundError) as e:
+        print(f"Ошибка: {e}")
+        return
+    print(f"\nБэктест '{strategy}' ({len(result.equity)} шагов, сделок: {result.trades}):")
+    print("-" * 40)
+    print(f"Начальная стоимость: {result.equity[0]:.2f} USD")
+    print(f"Итоговая стоимость: {result.equity[-1]:.2f} USD")
+    print(f"Доходность: {result.total_return * 100:.2f}%")
+    print(f"Макс. просадка: {result.max_drawdown * 100:.2f}%")
+
+
+def cmd_convert_data_simple(fmt: str, files: list):
+    """Перевести файлы данных в другой формат"""
+    if not _require_admin():
+        return
+    try:
+        results = convert_data(fmt, files)
+    except (ValueError, OSError) as e:
+        print(f"Ошибка: {e}")
+        return
+    for path, before, after in results:
+        print(f"{path}: {before} → {after} байт ({fmt})")
+
+
+def cmd_export_simple(dataset: str, args: list):
+    """
+    Потоковая выгрузка данных в CSV / JSON Lines: свои данные, у администратора —
+    все пользователи или один (--user N); история курсов — всем
+    """
+    compress = "--gzip" in args
+    options = _parse_options([a for a in args if a != "--gzip"])
+    output = options.get("output")
+    user_id = None
+    all_users = False
+    if dataset != "history":
+        if not CURRENT_USER:
+            print("Сначала выполните login")
+            return
+        if is_admin(CURRENT_USER):
+            all_users = "user" not in options
+        else:
+            user_id = CURRENT_USER['user_id']
+            if "user" in options and options["user"] != str(user_id):
+                print("Ошибка: выгружать можно только свои данные")
+                return
+    try:
+        if user_id is None and "user" in options:
+            user_id = int(options["user"])
+        count = export_data(
+            dataset,
+            fmt=options.get("format", "csv"),
+            output=output,
+            compress=compress,
+            user_id=user_id,
+            currency=options.get("currency"),
+            start=options.get("from"),
+            end=options.get("to"),
+            all_users=all_users,
+        )
+    except (ValueError, CurrencyNotFoundError, OSError) as e:
+        print(f"Ошибка: {e}")
+        return
+    if output and output != "-":
+        print(f"Выгружено {count} записей в {output}")
+
+
+def cmd_dashboard_simple(base: str = "USD"):
+    """Стоимость портфелей всех пользователей (через кэш оценок)"""
+    if not _require_admin():
+        return
+    try:
+        totals, holdings, stats = portfolio_dashboard(base)
+    except CurrencyNotFoundError as e:
+        print(f"Ошибка: {e}")
+        return
+    print(f"\nСтоимость портфелей ({base.upper()}):")
+    print("-" * 40)
+    for user_id, total in totals:
+        print(f"user {user_id}: {total:.2f}")
+    print("-" * 40)
+    print("Остатки по валютам:")
+    for code, minor, scale in holdings:
+        print(f"{code}: {format_minor(minor, scale)}")
+    print("-" * 40)
+    print(f"Кэш оценок: записей {stats['entries']}, ~{stats['bytes']} байт, "
+          f"попаданий {stats['hits']}, промахов {stats['misses']}, "
+          f"сбросов {stats['invalidations']}, вытеснено {stats['evictions']}")
+
+
+def cmd_reshard_simple(shards: int):
+    """Перераскладка пользователей по N шардам (только для администраторов)"""
+    if not _require_admin():
+        return
+    try:
+        moved = reshard(shards)
+    except ValueError as e:
+        print(f"Ошибка: {e}")
+        return
+    print(f"Пользователей: {moved}, шардов: {shards}")
+
+
+def cmd_alert_add_simple(from_currency: str, to_currency: str, kind: str, value: float, cooldown: int = None):
+    """Добавить оповещение о курсе"""
+    if not CURRENT_USER:
+        print("Сначала выполните login")
+        return
+    try:
+        alert = add_alert(CURRENT_USER['user_id'], from_currency, to_currency, kind, value, cooldown)
+        print(f"Оповещение {alert.alert_id} добавлено: {alert.pair} {alert.kind} {alert.value}")
+    except (ValueError, CurrencyNotFoundError) as e:
+        print(f"Ошибка: {e}")
+
+
+def cmd_alerts_simple():
+    """Показать оповещения пользователя"""
+    if not CURRENT_USER:
+        print("Сначала выполните login")
+        return
+    alerts = list_alerts(CURRENT_USER['user_id'])
+    if not alerts:
+        print("Оповещений нет")
+        return
+    for alert in alerts:
+        last = alert.last_triggered_at or "-"
+        print(f"{alert.alert_id}: {alert.pair} {alert.kind} {alert.value} (последнее срабатывание: {last})")
+
+
+def cmd_alert_remove_simple(alert_id: str):
+    """Удалить оповещение"""
+    if not CURRENT_USER:
+        print("Сначала выполните login")
+        return
+    try:
+        remove_alert(CURRENT_USER['user_id'], alert_id)
+        print(f"Оповещение {alert_id} удалено")
+    except ValueError as e:
+        print(f"Ошибка: {e}")
+
+
 def print_help():
     """Показать справку по командам"""
     commands = [
@@ -100,10 +443,28 @@ def print_help():
         ("login <username> <password>", "Вход"),
         ("logout", "Выход"),
         ("show-portfolio [--base USD]", "Портфель"),
+        ("show-portfolio --at <time>", "Портфель на момент в прошлом"),
+        ("show-portfolio --from <t> --to <t> [--step 1d]", "Стоимость портфеля по шагам"),
         ("buy <currency> <amount>", "Купить валюту"),
         ("sell <currency> <amount>", "Продать валюту"),
+        ("quote <buy|sell> <currency> <amount> [--ttl N]", "Зафиксировать курс сделки"),
+        ("buy --quote <id> / sell --quote <id>", "Сделка по котировке"),
         ("get-rate <from> <to>", "Курс валют"),
         ("update-rates", "Обновить курсы"),
+        ("stream-rates [--window S] [--duration S] [--host H] [--port P] [--stub]", "Курсы из потока тиков"),
+        ("history [--currency X] [--from t] [--to t] [--limit N] [--cursor C]", "История сделок"),
+        ("pnl [--method fifo|avg]", "Прибыль/убыток"),
+        ("pnl-report [--method fifo|avg]", "P&L всех пользователей (администратор)"),
+        ("backtest <dca|rebalance> [key=value ...]", "Бэктест стратегии"),
+        ("convert-data <json|msgpack> [file ...]", "Формат файлов данных (администратор)"),
+        ("export <portfolios|wallets|history|trades> [--format csv|jsonl] [--output f] [--gzip]",
+         "Выгрузка данных"),
+        ("  [--user N] [--currency X] [--from t] [--to t]", "Фильтры выгрузки (--user — администратор)"),
+        ("dashboard [--base USD]", "Стоимость портфелей всех пользователей (администратор)"),
+        ("reshard <N>", "Перераскладка данных по N шардам (администратор)"),
+        ("alert-add <from> <to> <kind> <value> [--cooldown N]", "Оповещение (above/below/cross/percent)"),
+        ("alerts", "Мои оповещения"),
+        ("alert-remove <id>", "Удалить оповещение"),
         ("exit", "Выход из программы")
     ]
     
@@ -131,12 +492,25 @@ def process_command(user_input: str):
         CURRENT_USER = None
         print("Вы вышли из системы")
     elif command == "show-portfolio":
-        base = "USD"
-        if args and args[0].startswith("--base="):
-            base = args[0].split("=")[1]
-        elif args and args[0] == "--base" and len(args) > 1:
-            base = args[1]
-        cmd_show_portfolio_simple(base)
+        options = _parse_options(args)
+        base = options.get("base", "USD")
+        if "at" in options:
+            cmd_show_portfolio_history_simple(base, at=options["at"])
+        elif "from" in options and "to" in options:
+            cmd_show_portfolio_history_simple(
+                base, start=options["from"], end=options["to"], step=options.get("step", "1d")
+            )
+        else:
+            cmd_show_portfolio_simple(base)
+    elif command in ("buy", "sell") and len(args) == 2 and args[0] == "--quote":
+        cmd_execute_quote_simple(command, args[1])
+    elif command == "quote" and len(args) in (3, 5):
+        try:
+            amount = float(args[2])
+            ttl = float(_parse_options(args[3:])["ttl"]) if len(args) == 5 else None
+            cmd_quote_simple(args[0], args[1], amount, ttl)
+        except (ValueError, KeyError):
+            print("Ошибка: количество и --ttl должны быть числами")
     elif command == "buy" and len(args) == 2:
         try:
             amount = float(args[1])
@@ -153,6 +527,38 @@ def process_command(user_input: str):
         cmd_get_rate_simple(args[0], args[1])
     elif command == "update-rates":
         cmd_update_rates_simple()
+    elif command == "stream-rates":
+        cmd_stream_rates_simple(args)
+    elif command == "history":
+        cmd_history_simple(_parse_options(args))
+    elif command == "pnl":
+        cmd_pnl_simple(_parse_options(args).get("method", "fifo"))
+    elif command == "pnl-report":
+        cmd_pnl_report_simple(_parse_options(args).get("method", "fifo"))
+    elif command == "backtest" and args:
+        cmd_backtest_simple(args[0], args[1:])
+    elif command == "convert-data" and args:
+        cmd_convert_data_simple(args[0], args[1:])
+    elif command == "export" and args:
+        cmd_export_simple(args[0], args[1:])
+    elif command == "dashboard":
+        cmd_dashboard_simple(_parse_options(args).get("base", "USD"))
+    elif command == "reshard" and len(args) == 1:
+        try:
+            cmd_reshard_simple(int(args[0]))
+        except ValueError:
+            print("Ошибка: число шардов должно быть целым")
+    elif command == "alert-add" and len(args) in (4, 6):
+        try:
+            value = float(args[3])
+            cooldown = int(args[5]) if len(args) == 6 and args[4] == "--cooldown" else None
+            cmd_alert_add_simple(args[0], args[1], args[2], value, cooldown)
+        except ValueError:
+            print("Ошибка: значение и cooldown должны быть числами")
+    elif command == "alerts":
+        cmd_alerts_simple()
+    elif command == "alert-remove" and len(args) == 1:
+        cmd_alert_remove_simple(args[0])
     else:
         print(f"Неизвестная команда: {command}. Введите 'help' для справки.")
 
@@ -0,0 +1,238 @@
+# valutatrade_hub/core/alerts.py
+import bisect
+import json
+import os
+import uuid
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from valutatrade_hub.infra import serialization
+from valutatrade_hub.infra.settings import SettingsLoader
+
+
+ALERT_KINDS = ("above", "below", "cross", "percent")
+
+
+@dataclass
+class Alert:
+    """Оповещение пользователя о курсе валютной пары"""
+    alert_id: str
+    user_id: int
+    pair: str
+    kind: str
+    value: float
+    reference_rate: Optional[float] = None
+    cooldown_seconds: int = 3600
+    last_triggered_at: Optional[str] = None
+    last_event_id: Optional[str] = None
+
+    def triggers(self) -> List[Tuple[float, str]]:
+        """Уровни срабатывания: список (уровень, направление пересечения)"""
+        if self.kind == "percent":
+            if not self.reference_rate:
+                return []
+            delta = self.reference_rate * self.value / 100
+            return [(self.reference_rate + delta, "up"), (self.reference_rate - delta, "down")]
+        if self.kind == "above":
+            return [(self.value, "up")]
+        if self.kind == "below":
+            return [(self.value, "down")]
+        return [(self.value, "any")]
+
+    def in_cooldown(self, now: datetime) -> bool:
+        if not self.last_triggered_at:
+            return False
+        last = datetime.fromisoformat(self.last_triggered_at)
+        return (now - last).total_seconds() < self.cooldown_seconds
+
+
+class AlertsEngine:
+    """
+    Движок оповещений о курсах.
+
+    Уровни срабатывания хранятся в отсортированных списках по каждой паре,
+    поэтому при обновлении курсов проверяются только уровни, лежащие
+    между предыдущим и новым значением курса (поиск через bisect).
+    """
+
+    def __init__(self):
+        settings = SettingsLoader()
+        self.alerts_file = settings.get("ALERTS_FILE")
+        self.outbox_file = settings.get("ALERTS_OUTBOX_FILE")
+        self.default_cooldown = settings.get("ALERT_COOLDOWN_SECONDS", 3600)
+        self.alerts: Dict[str, Alert] = {}
+        self._levels: Dict[str, List[float]] = {}
+        self._entries: Dict[str, List[Tuple[float, str, str]]] = {}
+        self._stamp: Optional[Tuple[int, int]] = None
+        self.reload()
+
+    # -----------------------------
+    # Хранение
+    # -----------------------------
+    def _file_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.alerts_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self):
+        """Перечитывает alerts.json и перестраивает индекс уровней"""
+        self._stamp = self._file_stamp()
+        self.alerts = {a["alert_id"]: Alert(**a) for a in serialization.load(self.alerts_file, [])}
+        self._rebuild_index()
+
+    def reload_if_changed(self) -> bool:
+        """Перечитывает оповещения, только если файл изменился после последнего чтения"""
+        if self._file_stamp() == self._stamp:
+            return False
+        self.reload()
+        return True
+
+    def save(self):
+        serialization.dump(self.alerts_file, [asdict(a) for a in self.alerts.values()])
+        self._stamp = self._file_stamp()
+
+    def _deliver(self, events: List[dict]):
+        """Дописывает сработавшие оповещения в локальный outbox (JSON Lines)"""
+        if not events:
+            return
+        os.makedirs(os.path.dirname(self.outbox_file), exist_ok=True)
+        with open(self.outbox_file, "a", encoding="utf-8") as f:
+            for event in events:
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+    # -----------------------------
+    # Индекс уровней
+    # -----------------------------
+    def _rebuild_index(self):
+        """Строит индекс заново: уровни каждой пары собираются и сортируются один раз"""
+        entries: Dict[str, List[Tuple[float, str, str]]] = {}
+        for alert in self.alerts.values():
+            pair_entries = entries.setdefault(alert.pair, [])
+            for level, direction in alert.triggers():
+                pair_entries.append((level, direction, alert.alert_id))
+        for pair_entries in entries.values():
+            pair_entries.sort(key=lambda e: e[0])
+        self._entries = entries
+        self._levels = {pair: [e[0] for e in pair_entries] for pair, pair_entries in entries.items()}
+
+    def _index_alert(self, alert: Alert):
+        levels = self._levels.setdefault(alert.pair, [])
+        entries = self._entries.setdefault(alert.pair, [])
+        for level, direction in alert.triggers():
+            pos = bisect.bisect_right(levels, level)
+            levels.insert(pos, level)
+            entries.insert(pos, (level, direction, alert.alert_id))
+
+    def _unindex_alert(self, alert: Alert):
+        levels = self._levels.get(alert.pair, [])
+        entries = self._entries.get(alert.pair, [])
+        for i in range(len(entries) - 1, -1, -1):
+            if entries[i][2] == alert.alert_id:
+                del entries[i]
+                del levels[i]
+
+    # -----------------------------
+    # Управление оповещениями
+    # -----------------------------
+    def add_alert(self, user_id: int, from_currency: str, to_currency: str, kind: str,
+                  value: float, reference_rate: Optional[float] = None,
+                  cooldown_seconds: Optional[int] = None) -> Alert:
+        kind = kind.lower()
+        if kind not in ALERT_KINDS:
+            raise ValueError(f"Неизвестный тип оповещения '{kind}'. Доступны: {', '.join(ALERT_KINDS)}")
+        if value <= 0:
+            raise ValueError("Значение оповещения должно быть положительным")
+        if kind == "percent" and not reference_rate:
+            raise ValueError("Для процентного оповещения нужен текущий курс пары")
+
+        alert = Alert(
+            alert_id=uuid.uuid4().hex[:8],
+            user_id=user_id,
+            pair=f"{from_currency.upper()}_{to_currency.upper()}",
+            kind=kind,
+            value=value,
+            reference_rate=reference_rate,
+            cooldown_seconds=self.default_cooldown if cooldown_seconds is None else cooldown_seconds,
+        )
+        self.alerts[alert.alert_id] = alert
+        self._index_alert(alert)
+        self.save()
+        return alert
+
+    def remove_alert(self, user_id: int, alert_id: str):
+        alert = self.alerts.get(alert_id)
+        if not alert or alert.user_id != user_id:
+            raise ValueError(f"Оповещение '{alert_id}' не найдено")
+        self._unindex_alert(alert)
+        del self.alerts[alert_id]
+        self.save()
+
+    def list_alerts(self, user_id: int) -> List[Alert]:
+        return [a for a in self.alerts.values() if a.user_id == user_id]
+
+    # -----------------------------
+    # Проверка при обновлении курсов
+    # -----------------------------
+    def _crossed(self, pair: str, old_rate: float, new_rate: float) -> List[Tuple[float, str, str]]:
+        """Возвращает уровни пары, пересечённые при движении old_rate -> new_rate"""
+        levels = self._levels.get(pair)
+        if not levels or old_rate == new_rate:
+            return []
+        entries = self._entries[pair]
+        if new_rate > old_rate:
+            lo = bisect.bisect_right(levels, old_rate)
+            hi = bisect.bisect_right(levels, new_rate)
+            return [e for e in entries[lo:hi] if e[1] in ("up", "any")]
+        lo = bisect.bisect_left(levels, new_rate)
+        hi = bisect.bisect_left(levels, old_rate)
+        return [e for e in entries[lo:hi] if e[1] in ("down", "any")]
+
+    def process_update(self, old_pairs: Dict[str, dict], new_pairs: Dict[str, dict],
+                       refreshed_at: Optional[str] = None) -> List[dict]:
+        """
+        Проверяет оповещения по паре старых/новых курсов (формат rates.json["pairs"]).
+        Сработавшие оповещения доставляются в outbox с учётом cooldown и дедупликации.
+        """
+        now = datetime.now(timezone.utc)
+        refreshed_at = refreshed_at or now.isoformat()
+        events = []
+        rearm = []
+
+        for pair in list(self._levels):
+            old, new = old_pairs.get(pair), new_pairs.get(pair)
+            if not old or not new:
+                continue
+            old_rate, new_rate = old["rate"], new["rate"]
+            for level, _, alert_id in self._crossed(pair, old_rate, new_rate):
+                alert = self.alerts[alert_id]
+                event_id = f"{alert_id}:{refreshed_at}"
+                if alert.last_event_id == event_id or alert.in_cooldown(now):
+                    continue
+                alert.last_event_id = event_id
+                alert.last_triggered_at = now.isoformat()
+                events.append({
+                    "event_id": event_id,
+                    "alert_id": alert_id,
+                    "user_id": alert.user_id,
+                    "pair": pair,
+                    "kind": alert.kind,
+                    "level": level,
+                    "old_rate": old_rate,
+                    "new_rate": new_rate,
+                    "triggered_at": alert.last_triggered_at,
+                })
+                if alert.kind == "percent":
+                    alert.reference_rate = new_rate
+                    rearm.append(alert)
+
+        for alert in rearm:
+            self._unindex_alert(alert)
+            self._index_alert(alert)
+
+        if events:
+            self._deliver(events)
+            self.save()
+        return events
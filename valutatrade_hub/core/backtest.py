@@ -0,0 +1,205 @@
+# valutatrade_hub/core/backtest.py
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from valutatrade_hub.core.utils import buy_cost_minor, from_minor, sell_revenue_minor, to_minor
+from valutatrade_hub.core.valuation import RateHistory
+
+# Точность по умолчанию для валют без записи в scales (как у криптовалют)
+DEFAULT_SCALE = 8
+
+
+@dataclass
+class HistoryColumns:
+    """История курсов в колоночном виде: время + array('d') на каждую валюту"""
+    timestamps: List[str]
+    rates: Dict[str, array]
+    scales: Dict[str, int] = field(default_factory=dict)
+
+    @classmethod
+    def from_history(cls, history: RateHistory,
+                     scales: Optional[Dict[str, int]] = None) -> "HistoryColumns":
+        currencies = sorted({c for snapshot in history.snapshots for c in snapshot})
+        rates = {c: array("d", (s.get(c, 0.0) for s in history.snapshots)) for c in currencies}
+        return cls([ts.isoformat() for ts in history.timestamps], rates, dict(scales or {}))
+
+    def __len__(self):
+        return len(self.timestamps)
+
+
+class SimPortfolio:
+    """
+    Симулируемый портфель: сделки по тем же правилам, что buy_currency/sell_currency —
+    балансы в целых минимальных единицах, USD-часть округляется против пользователя.
+    """
+
+    def __init__(self, cash: float, scales: Optional[Dict[str, int]] = None):
+        self.scales = scales or {}
+        self.usd_scale = self.scales.get("USD", 2)
+        self.cash_minor = to_minor(cash, self.usd_scale)
+        self.holdings: Dict[str, int] = {}  # валюта -> баланс в минимальных единицах
+        self.trades = 0
+
+    @property
+    def cash(self) -> float:
+        return from_minor(self.cash_minor, self.usd_scale)
+
+    def amount(self, currency: str) -> float:
+        return from_minor(self.holdings.get(currency, 0), self.scales.get(currency, DEFAULT_SCALE))
+
+    def buy(self, currency: str, amount: float, rate: float) -> bool:
+        """Покупка `amount` валюты; rate — 1 USD = rate валюты"""
+        if rate <= 0:
+            return False
+        scale = self.scales.get(currency, DEFAULT_SCALE)
+        amount_minor = to_minor(amount, scale)
+        if amount_minor <= 0:
+            return False
+        cost_minor = buy_cost_minor(from_minor(amount_minor, scale), rate, self.usd_scale)
+        if cost_minor <= 0 or cost_minor > self.cash_minor:
+            return False
+        self.cash_minor -= cost_minor
+        self.holdings[currency] = self.holdings.get(currency, 0) + amount_minor
+        self.trades += 1
+        return True
+
+    def sell(self, currency: str, amount: float, rate: float) -> bool:
+        """Продажа `amount` валюты; rate — 1 USD = rate валюты"""
+        if rate <= 0:
+            return False
+        scale = self.scales.get(currency, DEFAULT_SCALE)
+        amount_minor = to_minor(amount, scale)
+        if amount_minor <= 0 or self.holdings.get(currency, 0) < amount_minor:
+            return False
+        revenue_minor = sell_revenue_minor(from_minor(amount_minor, scale), 1 / rate, self.usd_scale)
+        if revenue_minor <= 0:
+            return False
+        self.holdings[currency] -= amount_minor
+        self.cash_minor += revenue_minor
+        self.trades += 1
+        return True
+
+    def value(self, rates: Dict[str, float]) -> float:
+        """Оценка портфеля в USD (без округления сделки)"""
+        total = self.cash
+        for currency in self.holdings:
+            rate = rates.get(currency)
+            if rate:
+                total += self.amount(currency) / rate
+        return total
+
+
+# -----------------------------
+# Стратегии
+# -----------------------------
+def dca(step: int, rates: Dict[str, float], portfolio: SimPortfolio, params: dict):
+    """Усреднение: каждые `every` шагов покупать валюты `targets` на `usd` долларов"""
+    if step % int(params.get("every", 1)):
+        return
+    targets = params.get("targets", ("BTC", "ETH"))
+    usd = float(params.get("usd", 100))
+    for currency in targets:
+        rate = rates.get(currency)
+        if rate:
+            portfolio.buy(currency, usd * rate, rate)
+
+
+def threshold_rebalance(step: int, rates: Dict[str, float], portfolio: SimPortfolio, params: dict):
+    """Ребалансировка к целевым весам `weights`, когда отклонение больше `threshold`"""
+    weights = params.get("weights", {"BTC": 0.5, "ETH": 0.3})
+    threshold = float(params.get("threshold", 0.05))
+    total = portfolio.value(rates)
+    if total <= 0:
+        return
+    for currency, target in weights.items():
+        rate = rates.get(currency)
+        if not rate:
+            continue
+        current = portfolio.amount(currency) / rate / total
+        diff = target - current
+        if abs(diff) <= threshold:
+            continue
+        amount = abs(diff) * total * rate
+        if diff > 0:
+            portfolio.buy(currency, min(amount, portfolio.cash * rate), rate)
+        else:
+            portfolio.sell(currency, amount, rate)
+
+
+STRATEGIES: Dict[str, Callable] = {
+    "dca": dca,
+    "rebalance": threshold_rebalance,
+}
+
+
+# -----------------------------
+# Прогон
+# -----------------------------
+@dataclass
+class BacktestResult:
+    strategy: str
+    params: dict
+    equity: List[float] = field(default_factory=list)
+    drawdowns: List[float] = field(default_factory=list)
+    trades: int = 0
+
+    @property
+    def total_return(self) -> float:
+        if not self.equity or not self.equity[0]:
+            return 0.0
+        return self.equity[-1] / self.equity[0] - 1
+
+    @property
+    def max_drawdown(self) -> float:
+        return max(self.drawdowns, default=0.0)
+
+
+def run_backtest(columns: HistoryColumns, strategy: str, params: Optional[dict] = None,
+                 initial_cash: float = 10000.0) -> BacktestResult:
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Неизвестная стратегия '{strategy}'. Доступны: {', '.join(STRATEGIES)}")
+    params = params or {}
+    func = STRATEGIES[strategy]
+    portfolio = SimPortfolio(initial_cash, columns.scales)
+    result = BacktestResult(strategy, params)
+    currencies = list(columns.rates.items())
+    peak = 0.0
+
+    for step in range(len(columns)):
+        rates = {c: column[step] for c, column in currencies}
+        func(step, rates, portfolio, params)
+        value = portfolio.value(rates)
+        peak = max(peak, value)
+        result.equity.append(value)
+        result.drawdowns.append(1 - value / peak if peak else 0.0)
+
+    result.trades = portfolio.trades
+    return result
+
+
+_WORKER_COLUMNS: Optional[HistoryColumns] = None
+
+
+def _init_worker(columns: HistoryColumns):
+    global _WORKER_COLUMNS
+    _WORKER_COLUMNS = columns
+
+
+def _run_in_worker(spec: Tuple[str, dict, float]) -> BacktestResult:
+    strategy, params, initial_cash = spec
+    return run_backtest(_WORKER_COLUMNS, strategy, params, initial_cash)
+
+
+def run_batch(columns: HistoryColumns, specs: List[Tuple[str, dict]],
+              initial_cash: float = 10000.0, workers: Optional[int] = None) -> List[BacktestResult]:
+    """
+    Прогоняет набор (стратегия, параметры) в пуле процессов.
+    История передаётся каждому процессу один раз при его запуске.
+    """
+    tasks = [(strategy, params, initial_cash) for strategy, params in specs]
+    if workers == 1 or len(tasks) <= 1:
+        return [run_backtest(columns, *task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(columns,)) as pool:
+        return list(pool.map(_run_in_worker, tasks))
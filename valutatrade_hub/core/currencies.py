@@ -1,58 +1,159 @@
+import sys
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from typing import Dict
+from dataclasses import dataclass, field
+from typing import ClassVar, Dict, Iterable, List, Optional
 from .exceptions import CurrencyNotFoundError
+from valutatrade_hub.infra import serialization
+from valutatrade_hub.infra.settings import SettingsLoader
 
 
 # === Абстрактный базовый класс ===
-@dataclass
+@dataclass(slots=True)
 class Currency(ABC):
     """Абстрактный класс валюты"""
     name: str
     code: str
+    index: int = field(default=-1, kw_only=True, compare=False)
 
     def __post_init__(self):
         if not self.name or not isinstance(self.name, str):
             raise ValueError("Имя валюты не может быть пустым")
         if not self.code.isupper() or not (2 <= len(self.code) <= 5):
             raise ValueError("Код валюты должен быть в верхнем регистре и длиной 2–5 символов")
+        self.code = sys.intern(self.code)
 
     @abstractmethod
     def get_display_info(self) -> str:
         """Возвращает человекочитаемое описание валюты"""
         pass
 
+    @abstractmethod
+    def to_dict(self) -> dict:
+        pass
+
 
 # === Наследники ===
-@dataclass
+@dataclass(slots=True)
 class FiatCurrency(Currency):
     issuing_country: str
+    scale: ClassVar[int] = 2  # число знаков минимальной единицы (центы)
 
     def get_display_info(self) -> str:
         return f"[FIAT] {self.code} — {self.name} (Issuing: {self.issuing_country})"
 
+    def to_dict(self) -> dict:
+        return {"code": self.code, "name": self.name, "type": "fiat",
+                "issuing_country": self.issuing_country}
 
-@dataclass
+
+@dataclass(slots=True)
 class CryptoCurrency(Currency):
     algorithm: str
     market_cap: float
+    scale: ClassVar[int] = 8  # сатоши и аналоги
 
     def get_display_info(self) -> str:
         return f"[CRYPTO] {self.code} — {self.name} (Algo: {self.algorithm}, MCAP: {self.market_cap:.2e})"
 
+    def to_dict(self) -> dict:
+        return {"code": self.code, "name": self.name, "type": "crypto",
+                "algorithm": self.algorithm, "market_cap": self.market_cap}
+
+
+def _currency_from_dict(data: dict, index: int) -> Currency:
+    if data.get("type") == "crypto":
+        return CryptoCurrency(name=data["name"], code=data["code"], index=index,
+                              algorithm=data.get("algorithm", "—"),
+                              market_cap=float(data.get("market_cap", 0.0)))
+    return FiatCurrency(name=data["name"], code=data["code"], index=index,
+                        issuing_country=data.get("issuing_country", "—"))
+
+
+# Встроенный набор на случай отсутствия data/currencies.json
+_DEFAULT_CURRENCIES = [
+    {"code": "USD", "name": "US Dollar", "type": "fiat", "issuing_country": "United States"},
+    {"code": "EUR", "name": "Euro", "type": "fiat", "issuing_country": "Eurozone"},
+    {"code": "BTC", "name": "Bitcoin", "type": "crypto", "algorithm": "SHA-256", "market_cap": 1.12e12},
+    {"code": "ETH", "name": "Ethereum", "type": "crypto", "algorithm": "Ethash", "market_cap": 4.4e11},
+]
+
 
 # === Реестр валют ===
-_currency_registry: Dict[str, Currency] = {
-    "USD": FiatCurrency(name="US Dollar", code="USD", issuing_country="United States"),
-    "EUR": FiatCurrency(name="Euro", code="EUR", issuing_country="Eurozone"),
-    "BTC": CryptoCurrency(name="Bitcoin", code="BTC", algorithm="SHA-256", market_cap=1.12e12),
-    "ETH": CryptoCurrency(name="Ethereum", code="ETH", algorithm="Ethash", market_cap=4.4e11),
-}
+class CurrencyRegistry:
+    """
+    Реестр валют (Singleton), загружаемый из data/currencies.json.
+
+    Индекс валюты — её позиция в реестре; новые валюты только дописываются
+    в конец, поэтому индексы стабильны и используются как номера слотов
+    в бинарной таблице курсов (rates.bin).
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance.path = SettingsLoader().get("CURRENCIES_FILE")
+            cls._instance.reload()
+        return cls._instance
+
+    def reload(self):
+        entries = serialization.load(self.path, _DEFAULT_CURRENCIES)
+        self._by_index: List[Currency] = []
+        self.index_of: Dict[str, int] = {}
+        for data in entries:
+            self._append(data)
+
+    def _append(self, data: dict) -> Currency:
+        currency = _currency_from_dict(data, len(self._by_index))
+        self._by_index.append(currency)
+        self.index_of[currency.code] = currency.index
+        return currency
+
+    def save(self):
+        serialization.dump(self.path, [c.to_dict() for c in self._by_index])
+
+    def __len__(self):
+        return len(self._by_index)
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.index_of
+
+    def get(self, code: str) -> Currency:
+        index = self.index_of.get(code)
+        if index is None:
+            code = code.strip().upper()
+            index = self.index_of.get(code)
+            if index is None:
+                raise CurrencyNotFoundError(f"Неизвестная валюта '{code}'")
+        return self._by_index[index]
+
+    def by_index(self, index: int) -> Currency:
+        return self._by_index[index]
+
+    def codes(self) -> List[str]:
+        return [c.code for c in self._by_index]
+
+    def sync(self, codes: Iterable[str], names: Optional[Dict[str, str]] = None,
+             crypto: Iterable[str] = ()) -> int:
+        """
+        Добавляет неизвестные коды из списка провайдера. Возвращает число новых валют.
+        """
+        names = names or {}
+        crypto = set(crypto)
+        added = 0
+        for code in codes:
+            code = code.strip().upper()
+            if code in self.index_of or not code.isalpha() or not (2 <= len(code) <= 5):
+                continue
+            data = {"code": code, "name": names.get(code, code)}
+            data["type"] = "crypto" if code in crypto else "fiat"
+            self._append(data)
+            added += 1
+        if added:
+            self.save()
+        return added
 
 
 def get_currency(code: str) -> Currency:
     """Фабричный метод для получения валюты по коду"""
-    code = code.strip().upper()
-    if code not in _currency_registry:
-        raise CurrencyNotFoundError(code)
-    return _currency_registry[code]
+    return CurrencyRegistry().get(code)
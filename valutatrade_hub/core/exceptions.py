@@ -7,4 +7,5 @@ class CurrencyNotFoundError(Exception):
 class ApiRequestError(Exception):
     pass
 
-
+class QuoteError(Exception):
+    pass
@@ -0,0 +1,104 @@
+# valutatrade_hub/core/export.py
+import csv
+import gzip
+import json
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from valutatrade_hub.core.models import Portfolio
+from valutatrade_hub.infra.transactions import TransactionStore
+
+
+EXPORT_FORMATS = ("csv", "jsonl")
+
+# Колонки CSV каждого набора данных (в JSON Lines пишутся те же поля)
+DATASET_FIELDS: Dict[str, List[str]] = {
+    "portfolios": ["user_id", "wallet_count", "currencies"],
+    "wallets": ["user_id", "currency", "balance", "minor", "scale"],
+    "history": ["timestamp", "currency", "rate"],
+    "trades": ["trade_id", "user_id", "timestamp", "side", "currency", "pair",
+               "amount", "rate", "usd_amount"],
+}
+
+
+# -----------------------------
+# Источники (генераторы записей)
+# -----------------------------
+def portfolio_rows(portfolios: Iterable[Portfolio], currency: Optional[str] = None) -> Iterator[dict]:
+    for portfolio in portfolios:
+        codes = [w.currency for w in portfolio.wallets]
+        if currency and currency not in codes:
+            continue
+        yield {"user_id": portfolio.user_id, "wallet_count": len(codes), "currencies": ",".join(codes)}
+
+
+def wallet_rows(portfolios: Iterable[Portfolio], currency: Optional[str] = None) -> Iterator[dict]:
+    for portfolio in portfolios:
+        for wallet in portfolio.wallets:
+            if currency and wallet.currency != currency:
+                continue
+            yield {"user_id": portfolio.user_id, "currency": wallet.currency,
+                   "balance": wallet.balance, "minor": wallet.minor, "scale": wallet.scale}
+
+
+def history_rows(snapshots: Iterable, currency: Optional[str] = None) -> Iterator[dict]:
+    """Снимки (время, {валюта: курс к USD}) в длинном формате: строка на валюту"""
+    for ts, rates in snapshots:
+        if currency:
+            if currency in rates:
+                yield {"timestamp": ts, "currency": currency, "rate": rates[currency]}
+            continue
+        for code, rate in rates.items():
+            yield {"timestamp": ts, "currency": code, "rate": rate}
+
+
+def trade_rows(store: TransactionStore, user_id: Optional[int] = None, currency: Optional[str] = None,
+               start: Optional[datetime] = None, end: Optional[datetime] = None) -> Iterator[dict]:
+    user_ids = [user_id] if user_id is not None else store.user_ids()
+    for uid in user_ids:
+        for trade in store.iter_forward(uid, start, end):
+            if currency and trade.get("currency") != currency:
+                continue
+            yield trade
+
+
+# -----------------------------
+# Запись
+# -----------------------------
+@contextmanager
+def _open_output(output: Optional[str], compress: bool):
+    if output in (None, "-"):
+        if compress:
+            raise ValueError("Для сжатия gzip укажите файл --output")
+        yield sys.stdout
+    elif compress:
+        with gzip.open(output, "wt", encoding="utf-8", newline="") as f:
+            yield f
+    else:
+        with open(output, "w", encoding="utf-8", newline="") as f:
+            yield f
+
+
+def write_records(records: Iterable[dict], fields: List[str], fmt: str = "csv",
+                  output: Optional[str] = None, compress: bool = False) -> int:
+    """
+    Записывает поток записей в CSV или JSON Lines (опционально gzip).
+    Записи пишутся по одной по мере поступления; возвращает их число.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат '{fmt}'. Доступны: {', '.join(EXPORT_FORMATS)}")
+    count = 0
+    with _open_output(output, compress) as f:
+        if fmt == "csv":
+            writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+            writer.writeheader()
+            write = writer.writerow
+        else:
+            def write(record: dict):
+                f.write(json.dumps({k: record.get(k) for k in fields}, ensure_ascii=False) + "\n")
+        for record in records:
+            write(record)
+            count += 1
+    return count
@@ -1,7 +1,13 @@
-from dataclasses import dataclass
+from array import array
+from dataclasses import dataclass, field
+from typing import Dict, List
 import hashlib
 import uuid
 
+from valutatrade_hub.core.currencies import CurrencyRegistry
+from valutatrade_hub.core.exceptions import CurrencyNotFoundError
+from valutatrade_hub.core.utils import from_minor, to_minor
+
 @dataclass
 class User:
     username: str
@@ -28,14 +34,150 @@ class User:
 
 @dataclass
 class Wallet:
+    """Кошелёк: баланс хранится в целых минимальных единицах валюты"""
     currency: str
-    balance: float = 0.0
+    minor: int = 0
+    scale: int = 2
+    meta: dict = field(default_factory=dict)
+
+    @property
+    def balance(self) -> float:
+        return from_minor(self.minor, self.scale)
+
 
-@dataclass
 class Portfolio:
-    user_id: str
-    wallets: list[Wallet]
+    """
+    Портфель пользователя в колоночном виде: индексы валют из реестра
+    (array('H')) и балансы в минимальных единицах (array('q')).
+    Все изменения балансов — целочисленные, без накопления ошибок округления.
+    version растёт при каждом изменении баланса (по нему сбрасываются кэши оценок).
+    """
+    __slots__ = ("user_id", "version", "_currencies", "_amounts", "meta", "extra")
+
+    def __init__(self, user_id, wallets=()):
+        self.user_id = user_id
+        self.version = 0
+        self._currencies = array("H")
+        self._amounts = array("q")
+        self.meta: Dict[str, dict] = {}
+        self.extra: dict = {}
+        for wallet in wallets:
+            self._set(wallet.currency, wallet.minor)
+            if wallet.meta:
+                self.meta[wallet.currency] = wallet.meta
+
+    @staticmethod
+    def _registry() -> CurrencyRegistry:
+        return CurrencyRegistry()
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Portfolio":
+        """Читает портфель; поддерживает старый формат с дробным полем balance"""
+        portfolio = cls(data["user_id"])
+        portfolio.version = int(data.get("version", 0))
+        registry = cls._registry()
+        unsupported = []
+        for item in data.get("wallets", []):
+            try:
+                currency = registry.get(item["currency"])
+            except CurrencyNotFoundError:
+                unsupported.append(item)  # сохраняем как есть, в расчётах не участвует
+                continue
+            if "minor" in item:
+                minor = int(item["minor"])
+                stored_scale = int(item.get("scale", currency.scale))
+                if stored_scale != currency.scale:
+                    minor = to_minor(from_minor(minor, stored_scale), currency.scale)
+            else:
+                minor = to_minor(item.get("balance", 0.0), currency.scale)
+            portfolio._set(currency.code, minor)
+            meta = {k: v for k, v in item.items() if k not in ("currency", "minor", "scale", "balance")}
+            if meta:
+                portfolio.meta[currency.code] = meta
+        portfolio.extra = {k: v for k, v in data.items() if k not in ("user_id", "version", "wallets")}
+        if unsupported:
+            portfolio.extra["unsupported_wallets"] = unsupported
+        return portfolio
+
+    def to_dict(self) -> dict:
+        registry = self._registry()
+        wallets = []
+        for index, minor in zip(self._currencies, self._amounts):
+            currency = registry.by_index(index)
+            item = {"currency": currency.code, "minor": minor, "scale": currency.scale}
+            item.update(self.meta.get(currency.code, {}))
+            wallets.append(item)
+        return {"user_id": self.user_id, "version": self.version, "wallets": wallets, **self.extra}
+
+    def _position(self, code: str) -> int:
+        index = self._registry().index_of[code]
+        try:
+            return self._currencies.index(index)
+        except ValueError:
+            return -1
+
+    def _set(self, code: str, minor: int):
+        pos = self._position(code)
+        if pos < 0:
+            self._currencies.append(self._registry().index_of[code])
+            self._amounts.append(minor)
+        else:
+            self._amounts[pos] = minor
+
+    def __contains__(self, code: str) -> bool:
+        return self._position(code) >= 0
+
+    def __len__(self):
+        return len(self._amounts)
+
+    def get_minor(self, code: str) -> int:
+        pos = self._position(code)
+        return self._amounts[pos] if pos >= 0 else 0
+
+    def get_balance(self, code: str) -> float:
+        return from_minor(self.get_minor(code), self._registry().get(code).scale)
+
+    def add_minor(self, code: str, delta: int):
+        """Изменяет баланс на delta минимальных единиц (кошелёк создаётся при необходимости)"""
+        self._set(code, self.get_minor(code) + delta)
+        self.version += 1
+
+    @property
+    def wallets(self) -> List[Wallet]:
+        registry = self._registry()
+        result = []
+        for index, minor in zip(self._currencies, self._amounts):
+            currency = registry.by_index(index)
+            result.append(Wallet(currency.code, minor, currency.scale, self.meta.get(currency.code, {})))
+        return result
+
+    def balances(self) -> Dict[str, float]:
+        return {w.currency: w.balance for w in self.wallets}
+
+
+class HoldingsTable:
+    """
+    Балансы всех пользователей в трёх колонках (user, индекс валюты, сумма).
+    Агрегаты по валютам считаются точно — суммированием целых чисел.
+    """
+    __slots__ = ("users", "currencies", "amounts")
 
+    def __init__(self):
+        self.users = array("q")
+        self.currencies = array("H")
+        self.amounts = array("q")
 
+    def append(self, portfolio: Portfolio):
+        self.users.extend([int(portfolio.user_id)] * len(portfolio._amounts))
+        self.currencies.extend(portfolio._currencies)
+        self.amounts.extend(portfolio._amounts)
 
+    def __len__(self):
+        return len(self.amounts)
 
+    def totals_minor(self) -> Dict[int, int]:
+        """Сумма балансов по индексу валюты в минимальных единицах"""
+        totals: Dict[int, int] = {}
+        for index, minor in zip(self.currencies, self.amounts):
+            totals[index] = totals.get(index, 0) + minor
+        return totals
@@ -0,0 +1,127 @@
+# valutatrade_hub/core/pnl.py
+from dataclasses import dataclass, field, asdict
+from typing import List, Optional
+
+
+PNL_METHODS = ("fifo", "avg")
+
+
+@dataclass
+class CostBasis:
+    """
+    Себестоимость позиции кошелька в USD.
+
+    Все показатели поддерживаются инкрементально при каждой сделке:
+    средняя себестоимость, FIFO-лоты, реализованный P&L по обоим методам
+    и накопленный множитель доходности, взвешенной по времени (TWR).
+    """
+    quantity: float = 0.0
+    total_cost: float = 0.0
+    lots: List[List[float]] = field(default_factory=list)
+    realized_avg: float = 0.0
+    realized_fifo: float = 0.0
+    twr_factor: float = 1.0
+    last_value: float = 0.0
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> Optional["CostBasis"]:
+        return cls(**data) if data else None
+
+    @classmethod
+    def opening(cls, quantity: float, price: float) -> "CostBasis":
+        """Открывающая позиция для баланса без истории (оценивается по текущей цене)"""
+        basis = cls()
+        if quantity > 0:
+            basis.quantity = quantity
+            basis.total_cost = quantity * price
+            basis.lots = [[quantity, price]]
+            basis.last_value = quantity * price
+        return basis
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @property
+    def fifo_cost(self) -> float:
+        return sum(qty * price for qty, price in self.lots)
+
+    def _roll_twr(self, price: float):
+        """Закрывает подпериод TWR перед денежным потоком в позицию"""
+        if self.last_value > 0:
+            self.twr_factor *= (self.quantity * price) / self.last_value
+
+    def on_buy(self, amount: float, price: float):
+        self._roll_twr(price)
+        self.quantity += amount
+        self.total_cost += amount * price
+        self.lots.append([amount, price])
+        self.last_value = self.quantity * price
+
+    def on_sell(self, amount: float, price: float):
+        self._roll_twr(price)
+        avg_cost = self.total_cost / self.quantity if self.quantity else 0.0
+        self.realized_avg += amount * (price - avg_cost)
+        self.total_cost -= amount * avg_cost
+
+        remaining = amount
+        while remaining > 1e-12 and self.lots:
+            lot_qty, lot_price = self.lots[0]
+            used = min(lot_qty, remaining)
+            self.realized_fifo += used * (price - lot_price)
+            remaining -= used
+            if lot_qty - used <= 1e-12:
+                self.lots.pop(0)
+            else:
+                self.lots[0][0] = lot_qty - used
+
+        self.quantity = max(self.quantity - amount, 0.0)
+        if self.quantity <= 1e-12:
+            self.quantity = 0.0
+            self.total_cost = 0.0
+            self.lots = []
+        self.last_value = self.quantity * price
+
+    def cost(self, method: str = "fifo") -> float:
+        return self.fifo_cost if method == "fifo" else self.total_cost
+
+    def realized(self, method: str = "fifo") -> float:
+        return self.realized_fifo if method == "fifo" else self.realized_avg
+
+    def unrealized(self, price: float, method: str = "fifo") -> float:
+        return self.quantity * price - self.cost(method)
+
+    def time_weighted_return(self, price: float) -> float:
+        if self.last_value <= 0:
+            return self.twr_factor - 1
+        return self.twr_factor * (self.quantity * price) / self.last_value - 1
+
+
+def track_trade(meta: dict, side: str, amount: float, price: float, balance_before: float):
+    """Обновляет себестоимость в метаданных кошелька после сделки"""
+    basis = CostBasis.from_dict(meta.get("cost_basis"))
+    if basis is None:
+        basis = CostBasis.opening(balance_before, price)
+    if side == "buy":
+        basis.on_buy(amount, price)
+    else:
+        basis.on_sell(amount, price)
+    meta["cost_basis"] = basis.to_dict()
+
+
+def wallet_pnl(wallet, price: Optional[float], method: str = "fifo") -> Optional[dict]:
+    """Сводка P&L по кошельку (models.Wallet); None, если у кошелька нет себестоимости"""
+    basis = CostBasis.from_dict(wallet.meta.get("cost_basis"))
+    if basis is None:
+        return None
+    row = {
+        "currency": wallet.currency,
+        "quantity": basis.quantity,
+        "cost": basis.cost(method),
+        "realized": basis.realized(method),
+        "unrealized": None,
+        "twr": None,
+    }
+    if price is not None:
+        row["unrealized"] = basis.unrealized(price, method)
+        row["twr"] = basis.time_weighted_return(price)
+    return row
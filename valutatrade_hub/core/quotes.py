@@ -0,0 +1,80 @@
+# valutatrade_hub/core/quotes.py
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from .exceptions import QuoteError
+
+
+@dataclass(frozen=True)
+class Quote:
+    """Котировка: курс сделки, зафиксированный до момента expires_at"""
+    quote_id: str
+    user_id: int
+    side: str
+    currency: str
+    amount: float
+    rate: float
+    usd_amount: float
+    expires_at: float  # time.monotonic()
+
+    def seconds_left(self, now: Optional[float] = None) -> float:
+        now = time.monotonic() if now is None else now
+        return max(self.expires_at - now, 0.0)
+
+
+class QuoteCache:
+    """
+    Кэш котировок в памяти с TTL.
+
+    Записи хранятся в OrderedDict в порядке выдачи, поэтому истёкшие
+    котировки скапливаются в начале и вытесняются с головы без полного
+    обхода (срок проверяется и при исполнении). При превышении max_size
+    вытесняются самые старые котировки.
+    """
+
+    def __init__(self, ttl_seconds: float = 30, max_size: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._quotes: "OrderedDict[str, Quote]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._quotes)
+
+    def _evict(self, now: float):
+        while self._quotes:
+            quote = next(iter(self._quotes.values()))
+            if quote.expires_at > now and len(self._quotes) < self.max_size:
+                break
+            self._quotes.popitem(last=False)
+
+    def issue(self, user_id: int, side: str, currency: str, amount: float,
+              rate: float, usd_amount: float, ttl_seconds: Optional[float] = None) -> Quote:
+        now = time.monotonic()
+        self._evict(now)
+        ttl = self.ttl_seconds if ttl_seconds is None else min(ttl_seconds, self.ttl_seconds)
+        if ttl <= 0:
+            raise ValueError("Срок действия котировки должен быть положительным")
+        quote = Quote(uuid.uuid4().hex[:8], user_id, side, currency, amount,
+                      rate, usd_amount, now + ttl)
+        self._quotes[quote.quote_id] = quote
+        return quote
+
+    def get(self, user_id: int, quote_id: str, side: str) -> Quote:
+        """Действующая котировка пользователя для исполнения сделки"""
+        now = time.monotonic()
+        quote = self._quotes.get(quote_id)
+        if quote is None or quote.user_id != user_id:
+            raise QuoteError(f"Котировка '{quote_id}' не найдена")
+        if quote.side != side:
+            raise QuoteError(f"Котировка '{quote_id}' выдана на {quote.side}, а не на {side}")
+        if quote.expires_at <= now:
+            del self._quotes[quote_id]
+            raise QuoteError(f"Срок действия котировки '{quote_id}' истёк, запросите новую")
+        return quote
+
+    def discard(self, quote_id: str):
+        """Удаляет исполненную котировку (котировка одноразовая)"""
+        self._quotes.pop(quote_id, None)
@@ -1,67 +1,138 @@
 import os
-import json
-from valutatrade_hub.core.models import User
+from contextlib import contextmanager
+from datetime import timedelta
+from valutatrade_hub.core.models import User, Portfolio, HoldingsTable
+from valutatrade_hub.infra import serialization
+from valutatrade_hub.infra.settings import SettingsLoader
+from valutatrade_hub.infra.shards import ShardedStore
+from valutatrade_hub.infra.transactions import TransactionStore
 from valutatrade_hub.core.exceptions import InsufficientFundsError, CurrencyNotFoundError, ApiRequestError
+from valutatrade_hub.core.currencies import CurrencyRegistry, get_currency
+from valutatrade_hub.core.utils import buy_cost_minor, sell_revenue_minor, to_minor, from_minor
+from valutatrade_hub.core.pnl import PNL_METHODS, track_trade, wallet_pnl
+from valutatrade_hub.core.valuation import Valuation, ValuationCache, parse_timestamp, value_portfolio
+from valutatrade_hub.core.quotes import Quote, QuoteCache
+from valutatrade_hub.core import export
 
 
 USERS_FILE = "data/users.json"
 PORTFOLIOS_FILE = "data/portfolios.json"
 RATES_FILE = "data/rates.json"  
+SHARED_RATES_FILE = "data/rates.bin"
+BASE_CURRENCY = "USD"
 # -----------------------------
 # Общие функции для JSON
 # -----------------------------
 def _load_json(file_path):
-    if not os.path.exists(file_path):
-        if file_path.endswith("rates.json"):
-            return {"pairs": {}, "last_refresh": None}
-        return []
-    with open(file_path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    if file_path.endswith("rates.json"):
+        return serialization.load(file_path, {"pairs": {}, "last_refresh": None})
+    return serialization.load(file_path, [])
 
 def _save_json(file_path, data):
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    serialization.dump(file_path, data)
+
+def _validate_currency(code: str) -> str:
+    """Проверяет код по реестру валют (O(1)) и возвращает его в каноническом виде"""
+    return get_currency(code).code
+
+# -----------------------------
+# Шарды пользователей и портфелей
+# -----------------------------
+_shard_store = None
+
+def _get_shard_store() -> ShardedStore:
+    """Хранилище шардов; при первом запуске переносит users.json / portfolios.json"""
+    global _shard_store
+    if _shard_store is None:
+        settings = SettingsLoader()
+        _shard_store = ShardedStore(settings.get("SHARDS_DIR"), settings.get("SHARD_COUNT", 8))
+        if _shard_store.is_empty() and (os.path.exists(USERS_FILE) or os.path.exists(PORTFOLIOS_FILE)):
+            _shard_store.import_legacy(USERS_FILE, PORTFOLIOS_FILE)
+    return _shard_store
+
+def _load_portfolios(user_id: int) -> list:
+    """Портфели шарда, в котором лежит портфель пользователя"""
+    store = _get_shard_store()
+    return [Portfolio.from_dict(p) for p in store.load(store.shard_of(user_id), "portfolios")]
+
+def _save_portfolios(user_id: int, portfolios: list):
+    store = _get_shard_store()
+    store.save(store.shard_of(user_id), "portfolios", [p.to_dict() for p in portfolios])
+
+@contextmanager
+def _locked_portfolios(user_id: int):
+    """Портфели шарда пользователя под монопольной блокировкой шарда"""
+    with _get_shard_store().user_shard(user_id, write=True):
+        yield _load_portfolios(user_id)
+
+def _find_portfolio(portfolios: list, user_id: int):
+    return next((p for p in portfolios if p.user_id == user_id), None)
+
+def _read_portfolio(store: ShardedStore, shard: int, user_id: int):
+    """Разбирает только запись портфеля пользователя (шард должен быть заблокирован)"""
+    data = store.find(shard, "portfolios", lambda p: p["user_id"] == user_id)
+    return Portfolio.from_dict(data) if data is not None else None
+
+def _get_portfolio(user_id: int):
+    store = _get_shard_store()
+    with store.user_shard(user_id) as shard:
+        return _read_portfolio(store, shard, user_id)
+
+def _all_portfolios():
+    """Портфели всех пользователей, шард за шардом (потоково)"""
+    for data in _get_shard_store().iter_all("portfolios"):
+        yield Portfolio.from_dict(data)
+
 
 # -----------------------------
 # Пользователи
 # -----------------------------
 def load_users():
-    return _load_json(USERS_FILE)
-
-def save_users(users):
-    _save_json(USERS_FILE, users)
+    """Все пользователи (обход всех шардов)"""
+    return list(_get_shard_store().iter_all("users"))
 
 def register_user(username: str, password: str) -> dict:
-    users = load_users()
-    if any(u["username"] == username for u in users):
-        raise ValueError("Пользователь с таким именем уже существует")
-    
-    # Правильная генерация ID
-    user_ids = [int(u["user_id"]) for u in users] if users else [0]
-    user_id = max(user_ids) + 1
-    
-    # Хэширование пароля
-    password_hash = User.hash_password(password)
-    user = {"user_id": user_id, "username": username, "password_hash": password_hash}
-    users.append(user)
-    save_users(users)
-
-    # Создаем портфель с начальным балансом
-    portfolios = _load_json(PORTFOLIOS_FILE)
-    portfolios.append({
-        "user_id": user_id, 
-        "wallets": [
-            {"currency": "USD", "balance": 10000.0}  # начальный баланс
-        ]
-    })
-    _save_json(PORTFOLIOS_FILE, portfolios)
-    
+    store = _get_shard_store()
+    with store.username_shard(username, write=True) as name_shard:
+        usernames = store.load(name_shard, "usernames")
+        if username in usernames:
+            raise ValueError("Пользователь с таким именем уже существует")
+
+        # ID выдаётся общей последовательностью, а не max() по всем пользователям
+        user_id = store.next_user_id()
+
+        # Хэширование пароля
+        password_hash = User.hash_password(password)
+        user = {"user_id": user_id, "username": username, "password_hash": password_hash}
+
+        with store.user_shard(user_id, write=True) as shard:
+            users = store.load(shard, "users")
+            users.append(user)
+            store.save(shard, "users", users)
+
+            # Создаем портфель с начальным балансом
+            portfolios = _load_portfolios(user_id)
+            portfolio = Portfolio(user_id)
+            portfolio.add_minor("USD", to_minor(10000.0, get_currency("USD").scale))  # начальный баланс
+            portfolios.append(portfolio)
+            _save_portfolios(user_id, portfolios)
+
+        usernames[username] = user_id
+        store.save(name_shard, "usernames", usernames)
+
     return user
 
+def _find_user(username: str):
+    store = _get_shard_store()
+    with store.username_shard(username) as name_shard:
+        user_id = store.load(name_shard, "usernames").get(username)
+    if user_id is None:
+        return None
+    with store.user_shard(user_id) as shard:
+        return next((u for u in store.load(shard, "users") if u["user_id"] == user_id), None)
+
 def login_user(username: str, password: str) -> dict:
-    users = load_users()
-    user = next((u for u in users if u["username"] == username), None)
+    user = _find_user(username)
     password_hash = User.hash_password(password)
     if not user or user["password_hash"] != password_hash:
         raise ValueError("Неверный логин или пароль")
@@ -70,114 +141,447 @@ def login_user(username: str, password: str) -> dict:
 # -----------------------------
 # Портфель
 # -----------------------------
+_valuation_cache = None
+# user_id -> (отметка файла портфелей шарда, версия портфеля): пока файл шарда
+# не менялся, версия известна без чтения шарда
+_portfolio_versions = {}
+
+def _get_valuation_cache() -> ValuationCache:
+    global _valuation_cache
+    if _valuation_cache is None:
+        _valuation_cache = ValuationCache(SettingsLoader().get("VALUATION_CACHE_BYTES", 1 << 20))
+    return _valuation_cache
+
+def _rates_version():
+    """
+    Версия курсов — отметка файла rates.json, из которого читаются цены
+    (_usd_prices), поэтому кэш сбрасывается ровно при смене этих цен
+    """
+    return serialization.file_stamp(RATES_FILE)
+
+def _valuate(user_id, base_currency: str, version: int, refreshed_at,
+             load_portfolio, load_prices=None) -> Valuation:
+    """
+    Оценка портфеля через кэш; портфель (load_portfolio) и цены (load_prices)
+    запрашиваются только при промахе
+    """
+    cache = _get_valuation_cache()
+    key = (user_id, base_currency)
+    valuation = cache.get(key, version, refreshed_at)
+    if valuation is None:
+        portfolio = load_portfolio()
+        prices = load_prices() if load_prices else _usd_prices()
+        valuation = value_portfolio(portfolio.balances(), base_currency, prices)
+        cache.put(key, portfolio.version, refreshed_at, valuation)
+    return valuation
+
+def portfolio_valuation(user_id: int, base_currency: str = "USD"):
+    """
+    Оценка портфеля пользователя в base_currency (None, если портфеля нет).
+    При попадании в кэш файл шарда не читается: версия портфеля известна,
+    пока отметка файла шарда не изменилась.
+    """
+    base_currency = _validate_currency(base_currency)
+    refreshed_at = _rates_version()
+    store = _get_shard_store()
+    with store.user_shard(user_id) as shard:
+        shard_stamp = serialization.file_stamp(store.path(shard, "portfolios"))
+        known = _portfolio_versions.get(user_id)
+        portfolio = None
+        if known is None or known[0] != shard_stamp:
+            portfolio = _read_portfolio(store, shard, user_id)
+            if portfolio is None:
+                return None
+            known = _portfolio_versions[user_id] = (shard_stamp, portfolio.version)
+        return _valuate(user_id, base_currency, known[1], refreshed_at,
+                        lambda: portfolio or _read_portfolio(store, shard, user_id))
+
+def portfolio_dashboard(base_currency: str = "USD") -> tuple:
+    """
+    Стоимость портфелей всех пользователей через общий кэш оценок и
+    суммарные остатки по валютам. Курсы загружаются один раз и только если
+    есть промахи кэша. Возвращает (список (user_id, стоимость),
+    остатки [(код, минимальные единицы, scale)], статистика кэша).
+    """
+    base_currency = _validate_currency(base_currency)
+    refreshed_at = _rates_version()
+    prices = {}
+
+    def load_prices():
+        if not prices:
+            prices.update(_usd_prices())
+        return prices
+
+    totals = []
+    holdings = HoldingsTable()
+    for portfolio in _all_portfolios():
+        valuation = _valuate(portfolio.user_id, base_currency, portfolio.version, refreshed_at,
+                             lambda: portfolio, load_prices)
+        totals.append((portfolio.user_id, valuation.total))
+        holdings.append(portfolio)
+    return totals, _holdings_summary(holdings), _get_valuation_cache().stats()
+
 def show_portfolio(user_id: int, base_currency="USD"):
-    portfolios = _load_json(PORTFOLIOS_FILE)
-    portfolio = next((p for p in portfolios if p["user_id"] == user_id), None)
-    if not portfolio:
+    valuation = portfolio_valuation(user_id, base_currency)
+    if not valuation:
         print("Портфель пуст")
         return
-    
+    base_currency = valuation.base
+
     print(f"\nПортфель пользователя (в {base_currency}):")
     print("-" * 40)
-    
+    for currency, balance, value in valuation.rows:
+        print(f"{currency}: {balance:.2f} (~{value:.2f} {base_currency})")
+    print("-" * 40)
+    print(f"Общая стоимость: {valuation.total:.2f} {base_currency}")
+
+def _current_holdings(user_id: int) -> dict:
+    portfolio = _get_portfolio(user_id)
+    return portfolio.balances() if portfolio else {}
+
+def _rate_history(start=None, end=None):
+    """История курсов за период (с курсом, действовавшим на начало периода)"""
+    from valutatrade_hub.core.valuation import RateHistory
+    from valutatrade_hub.parser_service.storage import RatesStorage
+    return RateHistory(RatesStorage().get_range(start, end, include_previous=True))
+
+def _undo_trade(holdings: dict, trade: dict):
+    """Откатывает сделку в словаре балансов (движение назад во времени)"""
+    sign = -1 if trade["side"] == "buy" else 1
+    currency = trade["currency"]
+    holdings[currency] = holdings.get(currency, 0.0) + sign * trade["amount"]
+    holdings["USD"] = holdings.get("USD", 0.0) - sign * trade["usd_amount"]
+
+def _holdings_timeline(user_id: int, start, end) -> tuple:
+    """
+    Балансы на момент start и список (время, балансы после сделки) для сделок
+    в (start, end]. Восстанавливается из текущих балансов откатом журнала сделок.
+    """
+    holdings = _current_holdings(user_id)
+    changes = []
+    after_start = start + timedelta(microseconds=1)
+    for _, trade in _trade_store().iter_backwards(user_id, start=after_start):
+        moment = parse_timestamp(trade["timestamp"])
+        if moment <= end:
+            changes.append((moment, dict(holdings)))
+        _undo_trade(holdings, trade)
+    changes.reverse()
+    return holdings, changes
+
+def _holdings_at(user_id: int, at) -> dict:
+    """Состояние кошельков на момент `at` по журналу сделок"""
+    holdings, _ = _holdings_timeline(user_id, at, at)
+    return holdings
+
+def show_portfolio_at(user_id: int, at: str, base_currency="USD"):
+    """Стоимость портфеля по курсам из истории на момент `at`"""
+    base_currency = _validate_currency(base_currency)
+    moment = parse_timestamp(at)
+    history = _rate_history(moment, moment)
+    found = history.rates_at(moment)
+    if not found:
+        raise CurrencyNotFoundError(f"В истории нет курсов на {moment.isoformat()}")
+    snapshot_ts, rates = found
+
+    holdings = _holdings_at(user_id, moment)
+    if not holdings:
+        print("Портфель пуст")
+        return
+
+    print(f"\nПортфель на {moment.isoformat()} (в {base_currency}, курсы от {snapshot_ts.isoformat()}):")
+    print("-" * 40)
     total_value = 0.0
-    for wallet in portfolio["wallets"]:
-        currency = wallet["currency"]
-        balance = wallet["balance"]
-        
-        if currency == base_currency:
-            value = balance
-        else:
-            try:
-                rate, _ = get_rate(currency, base_currency)
-                value = balance * rate
-            except (CurrencyNotFoundError, ApiRequestError):
-                value = balance  # если курс не найден, показываем в оригинальной валюте
-        
+    for currency, balance in holdings.items():
+        value = history.convert(rates, balance, currency, base_currency)
+        if value is None:
+            print(f"{currency}: {balance:.2f} (курс не найден)")
+            continue
         total_value += value
         print(f"{currency}: {balance:.2f} (~{value:.2f} {base_currency})")
-    
     print("-" * 40)
     print(f"Общая стоимость: {total_value:.2f} {base_currency}")
+    return total_value
 
-def buy_currency(user_id: int, currency: str, amount: float):
+def show_portfolio_series(user_id: int, start: str, end: str, step: str = "1d", base_currency="USD"):
+    """Временной ряд стоимости портфеля с шагом `step`"""
+    from valutatrade_hub.core.valuation import parse_step
+    base_currency = _validate_currency(base_currency)
+    start_ts, end_ts = parse_timestamp(start), parse_timestamp(end)
+    history = _rate_history(start_ts, end_ts)
+    holdings, changes = _holdings_timeline(user_id, start_ts, end_ts)
+    series = history.value_series(holdings, base_currency, start_ts, end_ts, parse_step(step), changes)
+
+    print(f"\nСтоимость портфеля (в {base_currency}):")
+    print("-" * 40)
+    for at, value in series:
+        shown = f"{value:.2f}" if value is not None else "нет данных"
+        print(f"{at.isoformat()}  {shown}")
+    print("-" * 40)
+    return series
+
+def buy_currency(user_id: int, currency: str, amount: float, rate: float = None):
     if amount <= 0:
         raise ValueError("Сумма должна быть положительной")
+    currency = _validate_currency(currency)
         
-    portfolios = _load_json(PORTFOLIOS_FILE)
-    portfolio = next((p for p in portfolios if p["user_id"] == user_id), None)
-    if portfolio is None:
-        portfolio = {"user_id": user_id, "wallets": []}
-        portfolios.append(portfolio)
-    
-    # Находим или создаем кошелек для покупаемой валюты
-    target_wallet = next((w for w in portfolio["wallets"] if w["currency"] == currency), None)
-    if not target_wallet:
-        target_wallet = {"currency": currency, "balance": 0.0}
-        portfolio["wallets"].append(target_wallet)
-    
-    # Находим USD кошелек для списания
-    usd_wallet = next((w for w in portfolio["wallets"] if w["currency"] == "USD"), None)
-    if not usd_wallet:
-        raise InsufficientFundsError("Нет USD для покупки")
-    
-    # Получаем курс и рассчитываем стоимость
-    try:
-        rate, _ = get_rate("USD", currency)  # Сколько валюты получим за 1 USD
-        cost_usd = amount / rate
-    except (CurrencyNotFoundError, ApiRequestError) as e:
-        raise CurrencyNotFoundError(f"Не удалось получить курс для {currency}: {e}")
-    
-    if usd_wallet["balance"] < cost_usd:
-        raise InsufficientFundsError(f"Недостаточно USD. Нужно: {cost_usd:.2f}, доступно: {usd_wallet['balance']:.2f}")
-    
-    # Выполняем операцию
-    usd_wallet["balance"] -= cost_usd
-    target_wallet["balance"] += amount
-    
-    _save_json(PORTFOLIOS_FILE, portfolios)
+    scale = get_currency(currency).scale
+    usd_scale = get_currency("USD").scale
+    amount_minor = to_minor(amount, scale)
+    if amount_minor <= 0:
+        raise ValueError(f"Сумма меньше минимальной единицы {currency}")
+    amount = from_minor(amount_minor, scale)
+
+    with _locked_portfolios(user_id) as portfolios:
+        portfolio = _find_portfolio(portfolios, user_id)
+        if portfolio is None:
+            portfolio = Portfolio(user_id)
+            portfolios.append(portfolio)
+
+        # Проверяем USD кошелек для списания
+        if "USD" not in portfolio:
+            raise InsufficientFundsError("Нет USD для покупки")
+        usd_minor = portfolio.get_minor("USD")
+
+        # Получаем курс и рассчитываем стоимость
+        try:
+            if rate is None:
+                rate, _ = get_rate("USD", currency)  # Сколько валюты получим за 1 USD
+        except (CurrencyNotFoundError, ApiRequestError) as e:
+            raise CurrencyNotFoundError(f"Не удалось получить курс для {currency}: {e}")
+        # Стоимость округляется вверх: сделка не может обойтись дешевле курса
+        cost_minor = buy_cost_minor(amount, rate, usd_scale)
+        cost_usd = from_minor(cost_minor, usd_scale)
+        if cost_minor <= 0:
+            raise ValueError("Стоимость сделки меньше минимальной единицы USD")
+
+        if usd_minor < cost_minor:
+            raise InsufficientFundsError(
+                f"Недостаточно USD. Нужно: {cost_usd:.2f}, доступно: {from_minor(usd_minor, usd_scale):.2f}"
+            )
+
+        # Выполняем операцию (целочисленно, в минимальных единицах)
+        balance_before = portfolio.get_balance(currency)
+        portfolio.add_minor("USD", -cost_minor)
+        portfolio.add_minor(currency, amount_minor)
+        track_trade(portfolio.meta.setdefault(currency, {}), "buy", amount, cost_usd / amount, balance_before)
+
+        _save_portfolios(user_id, portfolios)
+        _record_trade(portfolio, "buy", currency, amount, f"USD_{currency}", rate, cost_usd)
     print(f"Куплено {amount:.2f} {currency} за {cost_usd:.2f} USD (курс: 1 USD = {rate:.4f} {currency})")
 
-def sell_currency(user_id: int, currency: str, amount: float):
+def sell_currency(user_id: int, currency: str, amount: float, rate: float = None):
     if amount <= 0:
         raise ValueError("Сумма должна быть положительной")
+    currency = _validate_currency(currency)
         
-    portfolios = _load_json(PORTFOLIOS_FILE)
-    portfolio = next((p for p in portfolios if p["user_id"] == user_id), None)
-    if not portfolio:
-        raise InsufficientFundsError("Портфель не найден")
-    
-    # Находим кошелек продаваемой валюты
-    source_wallet = next((w for w in portfolio["wallets"] if w["currency"] == currency), None)
-    if not source_wallet or source_wallet["balance"] < amount:
-        raise InsufficientFundsError(f"Недостаточно {currency} для продажи")
-    
-    # Находим или создаем USD кошелек
-    usd_wallet = next((w for w in portfolio["wallets"] if w["currency"] == "USD"), None)
-    if not usd_wallet:
-        usd_wallet = {"currency": "USD", "balance": 0.0}
-        portfolio["wallets"].append(usd_wallet)
-    
-    # Получаем курс и рассчитываем выручку
-    try:
-        rate, _ = get_rate(currency, "USD")  # Сколько USD получим за 1 единицу валюты
-        revenue_usd = amount * rate
-    except (CurrencyNotFoundError, ApiRequestError) as e:
-        raise CurrencyNotFoundError(f"Не удалось получить курс для {currency}: {e}")
-    
-    # Выполняем операцию
-    source_wallet["balance"] -= amount
-    usd_wallet["balance"] += revenue_usd
-    
-    _save_json(PORTFOLIOS_FILE, portfolios)
+    scale = get_currency(currency).scale
+    usd_scale = get_currency("USD").scale
+    amount_minor = to_minor(amount, scale)
+    if amount_minor <= 0:
+        raise ValueError(f"Сумма меньше минимальной единицы {currency}")
+    amount = from_minor(amount_minor, scale)
+
+    with _locked_portfolios(user_id) as portfolios:
+        portfolio = _find_portfolio(portfolios, user_id)
+        if not portfolio:
+            raise InsufficientFundsError("Портфель не найден")
+
+        # Проверяем кошелек продаваемой валюты
+        if portfolio.get_minor(currency) < amount_minor:
+            raise InsufficientFundsError(f"Недостаточно {currency} для продажи")
+
+        # Получаем курс и рассчитываем выручку
+        try:
+            if rate is None:
+                rate, _ = get_rate(currency, "USD")  # Сколько USD получим за 1 единицу валюты
+        except (CurrencyNotFoundError, ApiRequestError) as e:
+            raise CurrencyNotFoundError(f"Не удалось получить курс для {currency}: {e}")
+        # Выручка округляется вниз: сделка не может принести больше курса
+        revenue_minor = sell_revenue_minor(amount, rate, usd_scale)
+        revenue_usd = from_minor(revenue_minor, usd_scale)
+        if revenue_minor <= 0:
+            raise ValueError("Выручка от сделки меньше минимальной единицы USD")
+
+        # Выполняем операцию (целочисленно, в минимальных единицах)
+        balance_before = portfolio.get_balance(currency)
+        portfolio.add_minor(currency, -amount_minor)
+        portfolio.add_minor("USD", revenue_minor)
+        track_trade(portfolio.meta.setdefault(currency, {}), "sell", amount, revenue_usd / amount, balance_before)
+
+        _save_portfolios(user_id, portfolios)
+        _record_trade(portfolio, "sell", currency, amount, f"{currency}_USD", rate, revenue_usd)
     print(f"Продано {amount:.2f} {currency} за {revenue_usd:.2f} USD (курс: 1 {currency} = {rate:.4f} USD)")
 
+# -----------------------------
+# Котировки
+# -----------------------------
+_quote_cache = None
+
+def _get_quote_cache() -> QuoteCache:
+    """Кэш котировок процесса (живёт в памяти в течение сессии CLI)"""
+    global _quote_cache
+    if _quote_cache is None:
+        settings = SettingsLoader()
+        _quote_cache = QuoteCache(settings.get("QUOTE_TTL_SECONDS", 30),
+                                  settings.get("QUOTE_CACHE_SIZE", 1000))
+    return _quote_cache
+
+def create_quote(user_id: int, side: str, currency: str, amount: float,
+                 ttl_seconds: float = None) -> Quote:
+    """Фиксирует курс сделки на ttl_seconds и возвращает котировку"""
+    side = side.lower()
+    if side not in ("buy", "sell"):
+        raise ValueError("Котировка выдаётся только на buy или sell")
+    if amount <= 0:
+        raise ValueError("Сумма должна быть положительной")
+    currency = _validate_currency(currency)
+    scale = get_currency(currency).scale
+    amount = from_minor(to_minor(amount, scale), scale)
+    if amount <= 0:
+        raise ValueError(f"Сумма меньше минимальной единицы {currency}")
+
+    usd_scale = get_currency("USD").scale
+    if side == "buy":
+        rate, _ = get_rate("USD", currency)
+        usd_minor = buy_cost_minor(amount, rate, usd_scale)
+    else:
+        rate, _ = get_rate(currency, "USD")
+        usd_minor = sell_revenue_minor(amount, rate, usd_scale)
+    if usd_minor <= 0:
+        raise ValueError("Сумма сделки меньше минимальной единицы USD")
+    usd_amount = from_minor(usd_minor, usd_scale)
+    return _get_quote_cache().issue(user_id, side, currency, amount, rate, usd_amount, ttl_seconds)
+
+def execute_quote(user_id: int, quote_id: str, side: str):
+    """Исполняет сделку по зафиксированному курсу котировки, без чтения курсов"""
+    cache = _get_quote_cache()
+    quote = cache.get(user_id, quote_id, side)
+    trade = buy_currency if side == "buy" else sell_currency
+    trade(user_id, quote.currency, quote.amount, rate=quote.rate)
+    cache.discard(quote_id)
+
+# -----------------------------
+# История сделок
+# -----------------------------
+def _trade_store() -> TransactionStore:
+    return TransactionStore(SettingsLoader().get("TRANSACTIONS_DIR"))
+
+def _record_trade(portfolio: Portfolio, side: str, currency: str, amount: float,
+                  pair: str, rate: float, usd_amount: float) -> dict:
+    return _trade_store().record(portfolio.user_id, {
+        "side": side,
+        "currency": currency,
+        "pair": pair,
+        "amount": amount,
+        "rate": rate,
+        "usd_amount": usd_amount,
+        "balances": {currency: portfolio.get_balance(currency), "USD": portfolio.get_balance("USD")},
+    })
+
+def get_history(user_id: int, currency: str = None, start: str = None, end: str = None,
+                limit: int = 50, cursor: str = None) -> tuple:
+    """Сделки пользователя (новые первыми) и курсор следующей страницы"""
+    currency = _validate_currency(currency) if currency else None
+    start_ts = parse_timestamp(start) if start else None
+    end_ts = parse_timestamp(end) if end else None
+    return _trade_store().query(user_id, currency, start_ts, end_ts, limit, cursor)
+
+# -----------------------------
+# Прибыль и убытки
+# -----------------------------
+def _usd_prices() -> dict:
+    """Текущие цены валют в USD из rates.json (одно чтение на весь расчёт)"""
+    pairs = _load_json(RATES_FILE).get("pairs", {})
+    prices = {"USD": 1.0}
+    for key, pair in pairs.items():
+        currency, _, quote = key.partition("_")
+        if quote == "USD":
+            prices[currency] = pair["rate"]
+    return prices
+
+def _portfolio_pnl(portfolio: Portfolio, prices: dict, method: str) -> list:
+    rows = []
+    for wallet in portfolio.wallets:
+        row = wallet_pnl(wallet, prices.get(wallet.currency), method)
+        if row:
+            rows.append(row)
+    return rows
+
+def get_pnl(user_id: int, method: str = "fifo") -> list:
+    if method not in PNL_METHODS:
+        raise ValueError(f"Неизвестный метод '{method}'. Доступны: {', '.join(PNL_METHODS)}")
+    portfolio = _get_portfolio(user_id)
+    if not portfolio:
+        return []
+    return _portfolio_pnl(portfolio, _usd_prices(), method)
+
+def pnl_report(method: str = "fifo") -> list:
+    """Сводный P&L по всем пользователям (USD)"""
+    if method not in PNL_METHODS:
+        raise ValueError(f"Неизвестный метод '{method}'. Доступны: {', '.join(PNL_METHODS)}")
+    prices = _usd_prices()
+    report = []
+    for portfolio in _all_portfolios():
+        rows = _portfolio_pnl(portfolio, prices, method)
+        report.append({
+            "user_id": portfolio.user_id,
+            "realized": sum(r["realized"] for r in rows),
+            "unrealized": sum(r["unrealized"] or 0.0 for r in rows),
+            "wallets": rows,
+        })
+    return report
+
+def _holdings_summary(table: HoldingsTable) -> list:
+    """Суммарные остатки по валютам (точно, целыми минимальными единицами)"""
+    registry = CurrencyRegistry()
+    summary = []
+    for index, minor in sorted(table.totals_minor().items()):
+        currency = registry.by_index(index)
+        summary.append((currency.code, minor, currency.scale))
+    return summary
+
 # -----------------------------
 # Курсы
 # -----------------------------
+_shared_reader = None
+
+def _get_shared_reader():
+    """Ленивое открытие таблицы курсов rates.bin (одна на процесс)"""
+    global _shared_reader
+    if _shared_reader is None and os.path.exists(SHARED_RATES_FILE):
+        from valutatrade_hub.infra.shared_rates import SharedRatesReader
+        try:
+            _shared_reader = SharedRatesReader(SHARED_RATES_FILE, CurrencyRegistry().index_of)
+        except (OSError, ValueError):
+            return None
+    return _shared_reader
+
+def _get_shared_rate(from_currency: str, to_currency: str):
+    """
+    Курс пары из rates.bin. Как и в rates.json, доступны только пары
+    с базовой валютой; для остальных возвращается None.
+    """
+    if BASE_CURRENCY not in (from_currency, to_currency) or from_currency == to_currency:
+        return None
+    reader = _get_shared_reader()
+    if reader is None:
+        return None
+    other = to_currency if from_currency == BASE_CURRENCY else from_currency
+    found = reader.lookup(other)
+    if not found or not found[0]:
+        return None
+    rate, updated_at = found
+    if to_currency == BASE_CURRENCY:
+        rate = 1 / rate
+    return rate, updated_at.isoformat()
+
 def get_rate(from_currency: str, to_currency: str):
+    from_currency, to_currency = _validate_currency(from_currency), _validate_currency(to_currency)
+    shared = _get_shared_rate(from_currency, to_currency)
+    if shared:
+        return shared
     data = _load_json(RATES_FILE)
-    pair_key = f"{from_currency.upper()}_{to_currency.upper()}"
+    pair_key = f"{from_currency}_{to_currency}"
     pair = data.get("pairs", {}).get(pair_key)
     if not pair:
         raise CurrencyNotFoundError(f"Курс для {pair_key} не найден")
@@ -188,6 +592,130 @@ def update_rates(source=None):
     updater = RatesUpdater(source=source)
     return updater.run_update()
 
+# -----------------------------
+# Бэктестинг
+# -----------------------------
+def _currency_scales(history) -> dict:
+    """Точность валют истории для симуляции сделок (неизвестные коды пропускаются)"""
+    scales = {}
+    for code in {"USD", *(c for snapshot in history.snapshots for c in snapshot)}:
+        try:
+            scales[code] = get_currency(code).scale
+        except CurrencyNotFoundError:
+            pass
+    return scales
+
+
+def run_backtests(specs: list, initial_cash: float = 10000.0, workers: int = None) -> list:
+    """Прогон стратегий [(имя, параметры), ...] по истории курсов"""
+    from valutatrade_hub.core.backtest import HistoryColumns, run_batch
+    history = _rate_history()
+    if not len(history):
+        raise CurrencyNotFoundError("История курсов пуста")
+    columns = HistoryColumns.from_history(history, _currency_scales(history))
+    return run_batch(columns, specs, initial_cash=initial_cash, workers=workers)
+
+# -----------------------------
+# Оповещения о курсах
+# -----------------------------
+def add_alert(user_id: int, from_currency: str, to_currency: str, kind: str,
+              value: float, cooldown_seconds: int = None):
+    from valutatrade_hub.core.alerts import AlertsEngine
+    from_currency, to_currency = _validate_currency(from_currency), _validate_currency(to_currency)
+    # Оповещения проверяются по парам rates.json: пара, которой там нет, не сработает никогда
+    pair_key = f"{from_currency}_{to_currency}"
+    pair = _load_json(RATES_FILE).get("pairs", {}).get(pair_key)
+    if not pair:
+        raise CurrencyNotFoundError(f"Курс для {pair_key} не найден")
+    reference_rate = pair["rate"] if kind.lower() == "percent" else None
+    return AlertsEngine().add_alert(
+        user_id, from_currency, to_currency, kind, value,
+        reference_rate=reference_rate, cooldown_seconds=cooldown_seconds,
+    )
+
+def list_alerts(user_id: int):
+    from valutatrade_hub.core.alerts import AlertsEngine
+    return AlertsEngine().list_alerts(user_id)
+
+def remove_alert(user_id: int, alert_id: str):
+    from valutatrade_hub.core.alerts import AlertsEngine
+    AlertsEngine().remove_alert(user_id, alert_id)
+
+# -----------------------------
+# Форматы файлов данных
+# -----------------------------
+def convert_data(fmt: str, files: list = None) -> list:
+    """
+    Переводит файлы данных в формат fmt (json / msgpack). Без списка файлов
+    переводятся все файлы данных, включая сегменты истории курсов.
+    Файлы шардов переводятся под блокировкой хранилища шардов.
+    Возвращает список (путь, размер до, размер после).
+    """
+    if fmt not in serialization.FORMATS:
+        raise ValueError(f"Неизвестный формат '{fmt}'. Доступны: {', '.join(serialization.FORMATS)}")
+    results = []
+    store = _get_shard_store()
+    if not files:
+        from valutatrade_hub.parser_service.storage import RatesStorage
+        results.extend(RatesStorage().convert_format(fmt))
+        results.extend(store.convert(fmt))
+        settings = SettingsLoader()
+        files = [RATES_FILE, settings.get("CURRENCIES_FILE"), settings.get("ALERTS_FILE")]
+    else:
+        shard_files = [path for path in files if store.owns(path)]
+        if shard_files:
+            results.extend(store.convert(fmt, shard_files))
+        files = [path for path in files if not store.owns(path)]
+    for path in files:
+        if not os.path.exists(path):
+            continue
+        before = os.path.getsize(path)
+        after = serialization.convert(path, fmt)
+        results.append((path, before, after))
+    return results
+
+def export_data(dataset: str, fmt: str = "csv", output: str = None, compress: bool = False,
+                user_id: int = None, currency: str = None, start: str = None, end: str = None,
+                all_users: bool = False) -> int:
+    """
+    Потоковая выгрузка набора данных (portfolios / wallets / history / trades)
+    в CSV или JSON Lines. Исходные файлы разбираются инкрементально, поэтому
+    расход памяти не зависит от их размера. Все наборы, кроме общей истории
+    курсов, выгружаются для пользователя user_id, а с all_users (администратор) —
+    для всех пользователей шард за шардом. Возвращает число записей.
+    """
+    if dataset not in export.DATASET_FIELDS:
+        raise ValueError(f"Неизвестный набор '{dataset}'. Доступны: {', '.join(export.DATASET_FIELDS)}")
+    if all_users:
+        user_id = None
+    elif dataset != "history" and user_id is None:
+        raise ValueError(f"Для выгрузки '{dataset}' нужен пользователь")
+    currency = _validate_currency(currency) if currency else None
+    start_ts = parse_timestamp(start) if start else None
+    end_ts = parse_timestamp(end) if end else None
+
+    if dataset in ("portfolios", "wallets"):
+        if all_users:
+            portfolios = _all_portfolios()
+        else:
+            portfolios = [p for p in [_get_portfolio(user_id)] if p is not None]
+        to_rows = export.portfolio_rows if dataset == "portfolios" else export.wallet_rows
+        rows = to_rows(portfolios, currency)
+    elif dataset == "history":
+        from valutatrade_hub.parser_service.storage import RatesStorage
+        rows = export.history_rows(RatesStorage().iter_range(start_ts, end_ts), currency)
+    else:
+        rows = export.trade_rows(_trade_store(), user_id, currency, start_ts, end_ts)
+    return export.write_records(rows, export.DATASET_FIELDS[dataset], fmt, output, compress)
+
+def is_admin(user: dict) -> bool:
+    """Пользователь входит в ADMIN_USERS (переменная окружения VALUTATRADE_ADMINS)"""
+    return bool(user) and user.get("username") in SettingsLoader().get("ADMIN_USERS", ())
+
+def reshard(shards: int) -> int:
+    """Перераскладывает пользователей и портфели по shards шардам"""
+    return _get_shard_store().reshard(shards)
+
 # Функция для текущего пользователя (для декораторов)
 def get_current_user():
     """Получить текущего пользователя (для совместимости с декораторами)"""
@@ -0,0 +1,38 @@
+# valutatrade_hub/core/utils.py
+from decimal import Decimal, ROUND_CEILING, ROUND_FLOOR, ROUND_HALF_UP
+
+
+def buy_cost_minor(amount: float, rate: float, scale: int) -> int:
+    """
+    Стоимость покупки в минимальных единицах USD, округлённая вверх:
+    сделка не может стоить меньше, чем по курсу
+    """
+    if rate <= 0:
+        raise ValueError("Курс должен быть положительным")
+    return to_minor(Decimal(str(amount)) / Decimal(str(rate)), scale, ROUND_CEILING)
+
+
+def sell_revenue_minor(amount: float, rate: float, scale: int) -> int:
+    """
+    Выручка от продажи в минимальных единицах USD, округлённая вниз:
+    сделка не может принести больше, чем по курсу
+    """
+    if rate <= 0:
+        raise ValueError("Курс должен быть положительным")
+    return to_minor(Decimal(str(amount)) * Decimal(str(rate)), scale, ROUND_FLOOR)
+
+
+def to_minor(amount: float, scale: int, rounding: str = ROUND_HALF_UP) -> int:
+    """Переводит сумму в целые минимальные единицы (по умолчанию — округление половины вверх)"""
+    quantum = Decimal(1).scaleb(-scale)
+    return int(Decimal(str(amount)).quantize(quantum, rounding=rounding).scaleb(scale))
+
+
+def from_minor(minor: int, scale: int) -> float:
+    """Переводит минимальные единицы обратно в сумму"""
+    return minor / 10 ** scale
+
+
+def format_minor(minor: int, scale: int) -> str:
+    """Точная десятичная запись суммы в минимальных единицах (без float)"""
+    return str(Decimal(minor).scaleb(-scale))
@@ -0,0 +1,223 @@
+# valutatrade_hub/core/valuation.py
+import bisect
+import re
+import sys
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+
+_STEP_RE = re.compile(r"^(\d+)([smhd]?)$")
+_STEP_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_timestamp(value: str) -> datetime:
+    """Разбирает ISO-дату/время; время без зоны считается UTC"""
+    try:
+        ts = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"Некорректная дата '{value}'. Ожидается ISO-формат, например 2025-11-14T15:30")
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts
+
+
+def parse_step(value: str) -> timedelta:
+    """Разбирает шаг временного ряда: 30s, 15m, 6h, 1d или число секунд"""
+    match = _STEP_RE.match(value.strip().lower())
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Некорректный шаг '{value}'. Примеры: 30m, 6h, 1d")
+    return timedelta(seconds=int(match.group(1)) * _STEP_UNITS[match.group(2)])
+
+
+class RateHistory:
+    """
+    История курсов, отсортированная по времени.
+
+    Курсы в снимках заданы относительно базовой валюты (1 USD = rate X).
+    Пропущенные в снимке валюты заполняются последним известным значением,
+    поэтому каждый снимок самодостаточен.
+    """
+
+    def __init__(self, snapshots: Dict[str, Dict[str, float]], base_currency: str = "USD"):
+        self.base_currency = base_currency
+        parsed = []
+        for key, rates in snapshots.items():
+            if not isinstance(rates, dict):
+                continue
+            try:
+                parsed.append((parse_timestamp(key), rates))
+            except ValueError:
+                continue  # служебные ключи ("rates", "last_update")
+        parsed.sort(key=lambda item: item[0])
+
+        self.timestamps: List[datetime] = []
+        self.snapshots: List[Dict[str, float]] = []
+        current = {base_currency: 1.0}
+        for ts, rates in parsed:
+            current = {**current, **rates}
+            self.timestamps.append(ts)
+            self.snapshots.append(current)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def index_at(self, at: datetime) -> int:
+        """Индекс последнего снимка не позже `at` (-1, если такого нет)"""
+        return bisect.bisect_right(self.timestamps, at) - 1
+
+    def rates_at(self, at: datetime) -> Optional[Tuple[datetime, Dict[str, float]]]:
+        i = self.index_at(at)
+        if i < 0:
+            return None
+        return self.timestamps[i], self.snapshots[i]
+
+    def convert(self, rates: Dict[str, float], amount: float, currency: str, base: str) -> Optional[float]:
+        """Пересчитывает сумму по курсам одного снимка; None, если курса нет"""
+        if currency == base:
+            return amount
+        from_rate, to_rate = rates.get(currency), rates.get(base)
+        if not from_rate or not to_rate:
+            return None
+        return amount / from_rate * to_rate
+
+    def value_at_index(self, i: int, holdings: Dict[str, float], base: str) -> float:
+        rates = self.snapshots[i]
+        total = 0.0
+        for currency, balance in holdings.items():
+            value = self.convert(rates, balance, currency, base)
+            total += value if value is not None else 0.0
+        return total
+
+    def value_series(self, holdings: Dict[str, float], base: str,
+                     start: datetime, end: datetime, step: timedelta,
+                     changes: Optional[List[Tuple[datetime, Dict[str, float]]]] = None
+                     ) -> List[Tuple[datetime, Optional[float]]]:
+        """
+        Стоимость портфеля на каждом шаге [start, end].
+
+        holdings — состояние на start, changes — отсортированные по времени
+        состояния после сделок внутри периода. Стоимость считается один раз
+        на каждую пару (снимок курсов, состояние), а шаги сопоставляются
+        снимкам и сделкам за один проход указателями — без поиска на каждом шаге.
+        """
+        if end < start:
+            raise ValueError("Конец периода раньше начала")
+        changes = changes or []
+        values: Dict[Tuple[int, int], float] = {}
+        series = []
+        i = self.index_at(start)
+        j = 0
+        at = start
+        n, m = len(self.timestamps), len(changes)
+        while at <= end:
+            while i + 1 < n and self.timestamps[i + 1] <= at:
+                i += 1
+            while j < m and changes[j][0] <= at:
+                j += 1
+            if i < 0:
+                series.append((at, None))
+            else:
+                if (i, j) not in values:
+                    current = changes[j - 1][1] if j else holdings
+                    values[(i, j)] = self.value_at_index(i, current, base)
+                series.append((at, values[(i, j)]))
+            at += step
+        return series
+
+
+class Valuation(NamedTuple):
+    """Оценка портфеля: строки (валюта, баланс, стоимость в base) и итог"""
+    base: str
+    rows: List[Tuple[str, float, float]]
+    total: float
+
+
+def value_portfolio(balances: Dict[str, float], base: str, usd_prices: Dict[str, float]) -> Valuation:
+    """
+    Оценивает балансы в валюте base по ценам в USD (одна загрузка курсов
+    на весь портфель). Валюта без курса учитывается по номиналу.
+    """
+    base_price = usd_prices.get(base)
+    rows = []
+    total = 0.0
+    for currency, balance in balances.items():
+        price = usd_prices.get(currency)
+        if currency == base:
+            value = balance
+        elif price is not None and base_price:
+            value = balance * price / base_price
+        else:
+            value = balance
+        rows.append((currency, balance, value))
+        total += value
+    return Valuation(base, rows, total)
+
+
+class ValuationCache:
+    """
+    LRU-кэш оценок портфелей по ключу (user_id, base).
+
+    Запись действительна, пока совпадают версия портфеля и версия курсов
+    (отметка файла, из которого берутся цены); иначе она сбрасывается
+    при обращении.
+    Размер записей оценивается приблизительно, при превышении max_bytes
+    вытесняются давно не использованные.
+    """
+
+    def __init__(self, max_bytes: int = 1 << 20):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, Tuple[int, Any, Valuation, int]]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _estimate_size(valuation: Valuation) -> int:
+        size = sys.getsizeof(valuation) + sys.getsizeof(valuation.rows)
+        for row in valuation.rows:
+            size += sys.getsizeof(row) + sys.getsizeof(row[1]) + sys.getsizeof(row[2])
+        return size
+
+    def _drop(self, key: Hashable):
+        _, _, _, size = self._entries.pop(key)
+        self.size -= size
+
+    def get(self, key: Hashable, version: int, refreshed_at: Any) -> Optional[Valuation]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] == version and entry[1] == refreshed_at:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self._drop(key)
+            self.invalidations += 1
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, version: int, refreshed_at: Any, valuation: Valuation):
+        if key in self._entries:
+            self._drop(key)
+        size = self._estimate_size(valuation)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (version, refreshed_at, valuation, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+        }
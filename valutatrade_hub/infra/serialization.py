@@ -0,0 +1,244 @@
+# valutatrade_hub/infra/serialization.py
+import codecs
+import gzip
+import json
+import os
+import tempfile
+from typing import Any, BinaryIO, Iterator, Optional
+
+from valutatrade_hub.infra.settings import SettingsLoader
+
+try:  # быстрый JSON-бэкенд (необязательная зависимость)
+    import orjson
+except ImportError:
+    orjson = None
+
+try:  # MessagePack (необязательная зависимость)
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+MSGPACK_MAGIC = b"VTHMP\x01"
+FORMATS = ("json", "msgpack")
+
+
+def dumps(data: Any, fmt: Optional[str] = None) -> bytes:
+    """Сериализует данные в выбранный формат (по умолчанию — DATA_FORMAT из настроек)"""
+    fmt = fmt or SettingsLoader().get("DATA_FORMAT", "json")
+    if fmt == "json":
+        if orjson is not None:
+            return orjson.dumps(data)
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if fmt == "msgpack":
+        if msgpack is None:
+            raise ValueError("Формат msgpack недоступен: установите пакет msgpack")
+        return MSGPACK_MAGIC + msgpack.packb(data, use_bin_type=True)
+    raise ValueError(f"Неизвестный формат '{fmt}'. Доступны: {', '.join(FORMATS)}")
+
+
+def detect_format(raw: bytes) -> str:
+    """Определяет формат по заголовку: msgpack помечен magic-префиксом, иначе JSON"""
+    return "msgpack" if raw.startswith(MSGPACK_MAGIC) else "json"
+
+
+def loads(raw: bytes) -> Any:
+    if raw.startswith(MSGPACK_MAGIC):
+        if msgpack is None:
+            raise ValueError("Файл в формате msgpack, но пакет msgpack не установлен")
+        return msgpack.unpackb(raw[len(MSGPACK_MAGIC):], raw=False, strict_map_key=False)
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw.decode("utf-8"))
+
+
+def file_format(path: str) -> Optional[str]:
+    """Формат существующего файла (None, если файла нет)"""
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return detect_format(f.read(len(MSGPACK_MAGIC)))
+
+
+def file_stamp(path: str) -> Optional[tuple]:
+    """
+    Отметка версии файла (inode, mtime, размер); меняется при каждой записи,
+    так как dump заменяет файл целиком. None, если файла нет.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def load(path: str, default: Any = None) -> Any:
+    if not os.path.exists(path):
+        return default
+    with open(path, "rb") as f:
+        raw = f.read()
+    if not raw.strip():
+        return default
+    return loads(raw)
+
+
+def dump(path: str, data: Any, fmt: Optional[str] = None):
+    """
+    Атомарно записывает данные. Без явного fmt файл в msgpack остаётся
+    в msgpack, остальные пишутся в формате по умолчанию (DATA_FORMAT),
+    так что выбор формата делается один раз на файл командой конвертации.
+    """
+    if fmt is None and file_format(path) == "msgpack":
+        fmt = "msgpack"
+    raw = dumps(data, fmt)
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    # Уникальное имя: параллельные записи одного файла не делят временный файл
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            # mkstemp создаёт файл с правами 0600 — сохраняем права прежнего файла
+            os.chmod(tmp, os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644)
+            f.write(raw)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def convert(path: str, fmt: str) -> int:
+    """Перезаписывает файл в формате fmt; возвращает новый размер в байтах"""
+    dump(path, load(path), fmt)
+    return os.path.getsize(path)
+
+
+# -----------------------------
+# Потоковое чтение
+# -----------------------------
+_DECODER = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+
+
+class _JsonStream:
+    """Буфер текста JSON, дочитываемый кусками по мере разбора"""
+
+    def __init__(self, f: BinaryIO, chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.text = codecs.getincrementaldecoder("utf-8")()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Дочитывает следующий кусок, отбрасывая уже разобранную часть буфера"""
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        self.eof = not chunk
+        self.buf = self.buf[self.pos:] + self.text.decode(chunk, final=self.eof)
+        self.pos = 0
+        return not self.eof
+
+    def peek(self) -> str:
+        """Следующий значащий символ ("" в конце файла)"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Некорректный JSON: ожидался '{char}'")
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                obj, end = _DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # число на границе куска могло прочитаться не полностью ("1." из "1.5")
+            truncated = end == len(self.buf) or (
+                isinstance(obj, (int, float)) and self.buf[end] not in _WHITESPACE + ",]}"
+            )
+            if truncated and self.fill():
+                continue
+            self.pos = end
+            return obj
+
+
+def _iter_json_items(f: BinaryIO, chunk_size: int) -> Iterator[Any]:
+    stream = _JsonStream(f, chunk_size)
+    opener = stream.peek()
+    if opener == "":
+        return
+    if opener not in "[{":
+        raise ValueError("Потоковое чтение поддерживает только массив или объект верхнего уровня")
+    stream.pos += 1
+    closer = "]" if opener == "[" else "}"
+    if stream.peek() == closer:
+        return
+    while True:
+        if opener == "{":
+            key = stream.value()
+            stream.expect(":")
+            yield key, stream.value()
+        else:
+            yield stream.value()
+        char = stream.peek()
+        stream.pos += 1
+        if char == closer:
+            return
+        if char != ",":
+            raise ValueError("Некорректный JSON: ожидалась ',' между элементами")
+
+
+def _iter_msgpack_items(f: BinaryIO) -> Iterator[Any]:
+    if msgpack is None:
+        raise ValueError("Файл в формате msgpack, но пакет msgpack не установлен")
+    f.seek(len(MSGPACK_MAGIC))
+    first = f.read(1)
+    if not first:
+        return
+    f.seek(len(MSGPACK_MAGIC))
+    unpacker = msgpack.Unpacker(f, raw=False, strict_map_key=False)
+    tag = first[0]
+    if 0x80 <= tag <= 0x8f or tag in (0xde, 0xdf):
+        for _ in range(unpacker.read_map_header()):
+            key = unpacker.unpack()
+            yield key, unpacker.unpack()
+    elif 0x90 <= tag <= 0x9f or tag in (0xdc, 0xdd):
+        for _ in range(unpacker.read_array_header()):
+            yield unpacker.unpack()
+    else:
+        raise ValueError("Потоковое чтение поддерживает только массив или объект верхнего уровня")
+
+
+def iter_items(path: str, chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """
+    Потоково читает файл данных: элементы массива верхнего уровня или пары
+    (ключ, значение) объекта. В памяти держится только текущий элемент и
+    один кусок файла, поэтому расход памяти не зависит от размера файла.
+    Файлы .gz распаковываются на лету.
+    """
+    if not os.path.exists(path):
+        return
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        if f.read(len(MSGPACK_MAGIC)) == MSGPACK_MAGIC:
+            yield from _iter_msgpack_items(f)
+            return
+        f.seek(0)
+        yield from _iter_json_items(f, chunk_size)
@@ -12,6 +12,32 @@ class SettingsLoader:
             cls._instance.DATA_DIR = "data"
             cls._instance.USERS_FILE = os.path.join(cls._instance.DATA_DIR, "users.json")
             cls._instance.PORTFOLIOS_FILE = os.path.join(cls._instance.DATA_DIR, "portfolios.json")
+            cls._instance.CURRENCIES_FILE = os.path.join(cls._instance.DATA_DIR, "currencies.json")
+            cls._instance.TRANSACTIONS_DIR = os.path.join(cls._instance.DATA_DIR, "transactions")
+
+            # Шарды пользователей и портфелей (users.json / portfolios.json переносятся туда)
+            cls._instance.SHARDS_DIR = os.path.join(cls._instance.DATA_DIR, "shards")
+            cls._instance.SHARD_COUNT = 8
+
+            # Администраторы (служебные команды, например reshard): имена через запятую
+            cls._instance.ADMIN_USERS = tuple(
+                name.strip() for name in os.getenv("VALUTATRADE_ADMINS", "").split(",") if name.strip()
+            )
+
+            # Формат новых файлов данных: json (компактный) или msgpack
+            cls._instance.DATA_FORMAT = "json"
+
+            # Оповещения о курсах
+            cls._instance.ALERTS_FILE = os.path.join(cls._instance.DATA_DIR, "alerts.json")
+            cls._instance.ALERTS_OUTBOX_FILE = os.path.join(cls._instance.DATA_DIR, "alerts_outbox.jsonl")
+            cls._instance.ALERT_COOLDOWN_SECONDS = 3600
+
+            # Котировки: срок фиксации курса и размер кэша в памяти
+            cls._instance.QUOTE_TTL_SECONDS = 30
+            cls._instance.QUOTE_CACHE_SIZE = 1000
+
+            # Кэш оценок портфелей (LRU), предел памяти в байтах
+            cls._instance.VALUATION_CACHE_BYTES = 1 << 20
             
             # Больше не дублируем настройки парсера - они в ParserConfig
 
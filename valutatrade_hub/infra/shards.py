@@ -0,0 +1,285 @@
+# valutatrade_hub/infra/shards.py
+import json
+import os
+import shutil
+import zlib
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from valutatrade_hub.infra import serialization
+
+try:  # блокировки файлов (POSIX); без fcntl работаем без межпроцессных блокировок
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# Виды файлов шарда: записи пользователей, портфели, индекс имён (username -> user_id)
+SHARD_KINDS = ("users", "portfolios", "usernames")
+
+# Сколько записей решардинг держит в памяти до сброса во временные файлы
+SPILL_BATCH = 10_000
+
+
+def shard_key(value) -> int:
+    """Стабильный между запусками хеш (в отличие от hash() для строк)"""
+    return zlib.crc32(str(value).encode("utf-8"))
+
+
+@contextmanager
+def _flock(path: str, shared: bool = False):
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a+b") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class ShardedStore:
+    """
+    Хранилище пользователей и портфелей, разбитое на N шардов.
+
+    Пользователь и его портфель лежат в шарде crc32(user_id) % N, индекс
+    имён — в шарде crc32(username) % N, поэтому запись затрагивает файлы
+    одного шарда, а не общий файл всех пользователей. Каждый шард
+    блокируется отдельно. Файлы шардов живут в каталоге поколения
+    (g<номер>); решардинг пишет новое поколение и переключается на него
+    одной атомарной записью meta.json.
+    """
+
+    def __init__(self, root: str, default_shards: int = 8):
+        self.root = root
+        self.meta_path = os.path.join(root, "meta.json")
+        self._meta_lock = os.path.join(root, "meta.lock")
+        self._sequence_path = os.path.join(root, "sequence.json")
+        self._meta_held = 0
+        os.makedirs(root, exist_ok=True)
+        self.meta = serialization.load(self.meta_path, None)
+        if self.meta is None:
+            self.meta = {"generation": 1, "shards": default_shards}
+            os.makedirs(self._generation_dir(), exist_ok=True)
+            serialization.dump(self.meta_path, self.meta)
+
+    # -----------------------------
+    # Раскладка
+    # -----------------------------
+    @property
+    def count(self) -> int:
+        return self.meta["shards"]
+
+    def _generation_dir(self, generation: Optional[int] = None) -> str:
+        return os.path.join(self.root, f"g{generation or self.meta['generation']}")
+
+    def path(self, shard: int, kind: str, generation: Optional[int] = None) -> str:
+        return os.path.join(self._generation_dir(generation), f"{kind}_{shard:03d}.json")
+
+    def shard_of(self, user_id) -> int:
+        return shard_key(user_id) % self.count
+
+    def username_shard_of(self, username: str) -> int:
+        return shard_key(username) % self.count
+
+    def paths(self) -> List[str]:
+        """Существующие файлы данных текущего поколения"""
+        return [
+            self.path(shard, kind) for shard in range(self.count) for kind in SHARD_KINDS
+            if os.path.exists(self.path(shard, kind))
+        ]
+
+    # -----------------------------
+    # Блокировки
+    # -----------------------------
+    @contextmanager
+    def _current_layout(self):
+        """Разделяемая блокировка раскладки: решардинг не начнётся, пока она держится"""
+        if self._meta_held:
+            self._meta_held += 1
+            try:
+                yield
+            finally:
+                self._meta_held -= 1
+            return
+        with _flock(self._meta_lock, shared=True):
+            self.meta = serialization.load(self.meta_path, self.meta)
+            self._meta_held = 1
+            try:
+                yield
+            finally:
+                self._meta_held = 0
+
+    @contextmanager
+    def _locked(self, locate: Callable[[], int], lock_name: str, write: bool):
+        """Блокирует шард, номер которого вычисляется по актуальной раскладке"""
+        with self._current_layout():
+            shard = locate()
+            lock_path = os.path.join(self._generation_dir(), f"{lock_name}_{shard:03d}.lock")
+            with _flock(lock_path, shared=not write):
+                yield shard
+
+    def user_shard(self, user_id, write: bool = False):
+        """Блокирует шард пользователя (write — монопольно) и возвращает его номер"""
+        return self._locked(lambda: self.shard_of(user_id), "shard", write)
+
+    def username_shard(self, username: str, write: bool = False):
+        """Блокирует шард индекса имён и возвращает его номер"""
+        return self._locked(lambda: self.username_shard_of(username), "usernames", write)
+
+    # -----------------------------
+    # Данные шарда
+    # -----------------------------
+    def load(self, shard: int, kind: str) -> Any:
+        return serialization.load(self.path(shard, kind), {} if kind == "usernames" else [])
+
+    def save(self, shard: int, kind: str, data: Any):
+        serialization.dump(self.path(shard, kind), data)
+
+    def find(self, shard: int, kind: str, match: Callable[[Any], bool]) -> Optional[Any]:
+        """Первая запись шарда, подходящая под match (потоковый поиск без загрузки шарда)"""
+        return next((item for item in serialization.iter_items(self.path(shard, kind)) if match(item)), None)
+
+    def iter_all(self, kind: str) -> Iterator[Any]:
+        """Потоково обходит записи всех шардов (шард за шардом)"""
+        with self._current_layout():
+            for shard in range(self.count):
+                with self._locked(lambda: shard, "shard", write=False):
+                    yield from serialization.iter_items(self.path(shard, kind))
+
+    def next_user_id(self) -> int:
+        with _flock(self._sequence_path + ".lock"):
+            sequence = serialization.load(self._sequence_path, {"next_user_id": 1})
+            user_id = sequence["next_user_id"]
+            sequence["next_user_id"] = user_id + 1
+            serialization.dump(self._sequence_path, sequence)
+        return user_id
+
+    def _bump_sequence(self, user_id: int):
+        with _flock(self._sequence_path + ".lock"):
+            sequence = serialization.load(self._sequence_path, {"next_user_id": 1})
+            sequence["next_user_id"] = max(sequence["next_user_id"], user_id + 1)
+            serialization.dump(self._sequence_path, sequence)
+
+    # -----------------------------
+    # Перенос и решардинг
+    # -----------------------------
+    def is_empty(self) -> bool:
+        return not os.path.exists(self._sequence_path)
+
+    def import_legacy(self, users_path: str, portfolios_path: str) -> int:
+        """
+        Однократно раскладывает старые users.json / portfolios.json по шардам
+        (исходные файлы не изменяются). Возвращает число пользователей.
+        """
+        with _flock(self._meta_lock):
+            if not self.is_empty():
+                return 0
+            sources = {"users": [users_path], "portfolios": [portfolios_path]}
+            imported, max_user_id = self._rewrite(self.meta["generation"], self.count, sources)
+            self._bump_sequence(max_user_id)
+        return imported
+
+    def reshard(self, shards: int) -> int:
+        """Перераскладывает данные в shards шардов; возвращает число пользователей"""
+        if shards <= 0:
+            raise ValueError("Число шардов должно быть положительным")
+        with _flock(self._meta_lock):
+            self.meta = serialization.load(self.meta_path, self.meta)
+            old_generation = self.meta["generation"]
+            new_generation = old_generation + 1
+            shutil.rmtree(self._generation_dir(new_generation), ignore_errors=True)
+            sources = {
+                kind: [self.path(shard, kind) for shard in range(self.count)]
+                for kind in ("users", "portfolios")
+            }
+            moved, _ = self._rewrite(new_generation, shards, sources)
+            self.meta = {**self.meta, "generation": new_generation, "shards": shards}
+            serialization.dump(self.meta_path, self.meta)
+            shutil.rmtree(self._generation_dir(old_generation), ignore_errors=True)
+        return moved
+
+    def convert(self, fmt: str, paths: Optional[List[str]] = None) -> List[Tuple[str, int, int]]:
+        """
+        Переводит файлы шардов (по умолчанию все файлы текущего поколения) в формат
+        fmt под монопольной блокировкой раскладки, как решардинг: читатели и писатели
+        шардов ждут, поэтому ни одна запись не перетирается старой копией.
+        Возвращает (путь, размер до, размер после).
+        """
+        results = []
+        with _flock(self._meta_lock):
+            self.meta = serialization.load(self.meta_path, self.meta)
+            for path in self.paths() if paths is None else paths:
+                if not os.path.exists(path):
+                    continue
+                before = os.path.getsize(path)
+                results.append((path, before, serialization.convert(path, fmt)))
+        return results
+
+    def owns(self, path: str) -> bool:
+        """Файл лежит в каталоге хранилища (его запись требует блокировок шардов)"""
+        root = os.path.abspath(self.root)
+        return os.path.commonpath([root, os.path.abspath(path)]) == root
+
+    def _rewrite(self, generation: int, shards: int, sources: Dict[str, List[str]]) -> Tuple[int, int]:
+        """
+        Пишет шарды поколения generation из исходных файлов за один проход:
+        записи раскладываются пачками по временным файлам (JSON Lines) целевых
+        шардов, затем каждый шард собирается из своего файла. В памяти
+        одновременно находится только пачка записей или один шард.
+        Возвращает (число пользователей, максимальный user_id).
+        """
+        directory = self._generation_dir(generation)
+        os.makedirs(directory, exist_ok=True)
+        buffers: Dict[Tuple[str, int], List[str]] = {}
+        buffered = 0
+
+        def spill_path(kind: str, shard: int) -> str:
+            return os.path.join(directory, f"{kind}_{shard:03d}.spill")
+
+        def flush():
+            nonlocal buffered
+            for (kind, shard), lines in buffers.items():
+                with open(spill_path(kind, shard), "a", encoding="utf-8") as f:
+                    f.writelines(lines)
+            buffers.clear()
+            buffered = 0
+
+        def put(kind: str, shard: int, record: Any):
+            nonlocal buffered
+            buffers.setdefault((kind, shard), []).append(json.dumps(record, ensure_ascii=False) + "\n")
+            buffered += 1
+            if buffered >= SPILL_BATCH:
+                flush()
+
+        total = max_user_id = 0
+        try:
+            for path in sources["users"]:
+                for user in serialization.iter_items(path):
+                    user_id = int(user["user_id"])
+                    max_user_id = max(max_user_id, user_id)
+                    total += 1
+                    put("users", shard_key(user_id) % shards, user)
+                    put("usernames", shard_key(user["username"]) % shards, [user["username"], user_id])
+            for path in sources["portfolios"]:
+                for portfolio in serialization.iter_items(path):
+                    put("portfolios", shard_key(portfolio["user_id"]) % shards, portfolio)
+            flush()
+
+            for shard in range(shards):
+                for kind in SHARD_KINDS:
+                    path = spill_path(kind, shard)
+                    if not os.path.exists(path):
+                        continue
+                    with open(path, encoding="utf-8") as f:
+                        records = [json.loads(line) for line in f]
+                    data = dict(records) if kind == "usernames" else records
+                    serialization.dump(self.path(shard, kind, generation), data)
+                    os.remove(path)
+        finally:
+            for shard in range(shards):
+                for kind in SHARD_KINDS:
+                    if os.path.exists(spill_path(kind, shard)):
+                        os.remove(spill_path(kind, shard))
+        return total, max_user_id
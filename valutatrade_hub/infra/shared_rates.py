@@ -0,0 +1,206 @@
+# valutatrade_hub/infra/shared_rates.py
+import mmap
+import os
+import struct
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional, Tuple
+
+try:  # блокировка писателей (POSIX); без fcntl писатели не сериализуются
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Заголовок: magic, версия формата, число записей, seq, last_refresh (мкс от эпохи)
+HEADER = struct.Struct("<4sHHQq")
+# Запись: индекс валюты, код, курс (1 USD = rate), updated_at (мкс от эпохи)
+ENTRY = struct.Struct("<H6sdq")
+
+MAGIC = b"VTRS"
+LAYOUT_VERSION = 1
+CAPACITY = 512
+SEQ_OFFSET = 8
+FILE_SIZE = HEADER.size + CAPACITY * ENTRY.size
+# Сколько раз читатель повторяет чтение, прежде чем отказаться (и уйти на rates.json)
+READ_RETRIES = 10_000
+
+
+def to_micros(ts: datetime) -> int:
+    delta = ts - datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def from_micros(value: int) -> datetime:
+    return datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(microseconds=value)
+
+
+class SharedRatesWriter:
+    """
+    Публикует таблицу курсов фиксированного формата в memory-mapped файл.
+
+    Запись защищена seqlock: перед изменением seq становится нечётным,
+    после — чётным. Читатели повторяют чтение, если seq нечётный или
+    изменился за время чтения, поэтому им блокировки не нужны. Seqlock
+    рассчитан на одного писателя, поэтому писатели (update-rates,
+    планировщик, stream-rates) сериализуются монопольной блокировкой
+    файла <path>.lock.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock_path = path + ".lock"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._exclusive():
+            if not os.path.exists(path) or os.path.getsize(path) != FILE_SIZE:
+                with open(path, "wb") as f:
+                    f.write(HEADER.pack(MAGIC, LAYOUT_VERSION, 0, 0, 0))
+                    f.write(b"\0" * (FILE_SIZE - HEADER.size))
+
+    @contextmanager
+    def _exclusive(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, "a+b") as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _slots(self, mm: mmap.mmap) -> Dict[str, int]:
+        _, _, count, _, _ = HEADER.unpack_from(mm, 0)
+        slots = {}
+        for i in range(count):
+            _, code, _, _ = ENTRY.unpack_from(mm, HEADER.size + i * ENTRY.size)
+            slots[code.rstrip(b"\0").decode("ascii")] = i
+        return slots
+
+    def publish(self, rates: Iterable[Tuple[str, float]], refreshed_at: datetime,
+                index_of: Optional[Dict[str, int]] = None):
+        """
+        Записывает курсы (код, 1 USD = rate). Ранее опубликованные валюты
+        сохраняют свой индекс, новые добавляются в конец таблицы.
+        """
+        stamp = to_micros(refreshed_at)
+        rates = [(code.encode("ascii"), float(rate)) for code, rate in rates]  # ошибки — до записи
+        with self._exclusive(), open(self.path, "r+b") as f, mmap.mmap(f.fileno(), FILE_SIZE) as mm:
+            magic, _, count, seq, _ = HEADER.unpack_from(mm, 0)
+            seq += seq & 1  # прерванная запись могла оставить seq нечётным
+            if magic != MAGIC:
+                count = 0
+            slots = dict(index_of) if index_of is not None else self._slots(mm)
+
+            struct.pack_into("<Q", mm, SEQ_OFFSET, seq + 1)
+            try:
+                for code, rate in rates:
+                    slot = slots.get(code.decode("ascii"))
+                    if slot is None:
+                        slot = count
+                        slots[code.decode("ascii")] = slot
+                    if slot >= CAPACITY:
+                        continue
+                    ENTRY.pack_into(mm, HEADER.size + slot * ENTRY.size, slot, code, rate, stamp)
+                    count = max(count, slot + 1)
+                HEADER.pack_into(mm, 0, MAGIC, LAYOUT_VERSION, count, seq + 1, stamp)
+            finally:
+                struct.pack_into("<Q", mm, SEQ_OFFSET, seq + 2)
+
+    def invalidate(self):
+        """
+        Помечает таблицу недействительной (пустая, без magic): читатели уходят
+        на rates.json, пока следующая публикация не запишет курсы заново
+        """
+        with self._exclusive(), open(self.path, "r+b") as f, mmap.mmap(f.fileno(), FILE_SIZE) as mm:
+            _, _, _, seq, _ = HEADER.unpack_from(mm, 0)
+            seq += seq & 1
+            struct.pack_into("<Q", mm, SEQ_OFFSET, seq + 1)
+            try:
+                mm[HEADER.size:] = b"\0" * (FILE_SIZE - HEADER.size)
+                HEADER.pack_into(mm, 0, b"\0" * 4, LAYOUT_VERSION, 0, seq + 1, 0)
+            finally:
+                struct.pack_into("<Q", mm, SEQ_OFFSET, seq + 2)
+
+
+class SharedRatesReader:
+    """
+    Читатель таблицы курсов без разбора JSON и без блокировок.
+    Если передан index_of (код -> индекс из реестра валют), слот находится
+    сразу по индексу без сканирования таблицы.
+    """
+
+    def __init__(self, path: str, index_of: Optional[Dict[str, int]] = None):
+        self.path = path
+        self.index_of = index_of
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), FILE_SIZE, access=mmap.ACCESS_READ)
+        magic, version, _, _, _ = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != LAYOUT_VERSION:
+            self.close()
+            raise ValueError(f"Неизвестный формат таблицы курсов: {path}")
+        self._slots: Dict[str, int] = {}
+        self._slots_seq = -1
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def _seq(self) -> int:
+        return struct.unpack_from("<Q", self._mm, SEQ_OFFSET)[0]
+
+    def _read(self, read):
+        """
+        Согласованное чтение под seqlock: повторяет read(), пока seq чётный
+        и не изменился за время чтения. После READ_RETRIES попыток или если
+        таблица помечена недействительной возвращает None.
+        """
+        for _ in range(READ_RETRIES):
+            seq = self._seq()
+            if seq & 1:
+                time.sleep(0)
+                continue
+            if HEADER.unpack_from(self._mm, 0)[0] != MAGIC:
+                return None
+            result = read()
+            if self._seq() == seq:
+                return result
+        return None
+
+    def _refresh_slots(self, count: int):
+        """Пересобирает карту слотов после каждой публикации (ключ — seq)"""
+        seq = self._seq()
+        if seq == self._slots_seq:
+            return
+        slots = {}
+        for i in range(count):
+            _, code, _, _ = ENTRY.unpack_from(self._mm, HEADER.size + i * ENTRY.size)
+            slots[code.rstrip(b"\0").decode("ascii", "replace")] = i
+        self._slots, self._slots_seq = slots, seq
+
+    def lookup(self, code: str) -> Optional[Tuple[float, datetime]]:
+        """
+        Курс валюты (1 USD = rate) и время обновления; None, если валюты нет,
+        таблица недействительна или согласованно прочитать её не удалось
+        """
+        def read():
+            count = HEADER.unpack_from(self._mm, 0)[2]
+            if self.index_of is not None:
+                slot = self.index_of.get(code)
+            else:
+                self._refresh_slots(count)
+                slot = self._slots.get(code)
+            if slot is not None and slot < count:
+                _, stored, rate, stamp = ENTRY.unpack_from(self._mm, HEADER.size + slot * ENTRY.size)
+                if stored.rstrip(b"\0").decode("ascii", "replace") == code:
+                    return rate, stamp
+            return None
+
+        found = self._read(read)
+        if found is None:
+            return None
+        return found[0], from_micros(found[1])
+
+    def last_refresh(self) -> Optional[datetime]:
+        stamp = self._read(lambda: HEADER.unpack_from(self._mm, 0)[4])
+        return from_micros(stamp) if stamp else None
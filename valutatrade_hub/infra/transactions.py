@@ -0,0 +1,162 @@
+# valutatrade_hub/infra/transactions.py
+import json
+import mmap
+import os
+import struct
+import uuid
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional, Tuple
+
+from valutatrade_hub.infra.shared_rates import from_micros, to_micros
+
+# Запись индекса: время сделки (мкс от эпохи), смещение записи в файле сделок
+INDEX_ENTRY = struct.Struct("<qQ")
+
+
+class TransactionStore:
+    """
+    Журнал сделок пользователей.
+
+    У каждого пользователя свой append-only файл сделок (JSON Lines) и
+    бинарный индекс фиксированной ширины (время, смещение). Индекс
+    упорядочен по времени, поэтому границы периода ищутся бинарным поиском,
+    а страница последних сделок читается с конца — стоимость запроса
+    не зависит от общего числа сделок в системе.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, user_id) -> Tuple[str, str]:
+        base = os.path.join(self.directory, f"user_{user_id}")
+        return base + ".jsonl", base + ".idx"
+
+    # -----------------------------
+    # Запись
+    # -----------------------------
+    def record(self, user_id, trade: dict) -> dict:
+        """Добавляет сделку; trade_id и timestamp проставляются автоматически"""
+        data_path, index_path = self._paths(user_id)
+        now = datetime.now(timezone.utc)
+        stamp = to_micros(now)
+        last = self._last_stamp(index_path)
+        if last is not None and stamp <= last:
+            stamp = last + 1  # сохраняем строгий порядок индекса
+        entry = {
+            "trade_id": uuid.uuid4().hex[:12],
+            "user_id": user_id,
+            "timestamp": from_micros(stamp).isoformat(),
+            **trade,
+        }
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(data_path, "ab") as f:
+            offset = f.seek(0, os.SEEK_END)
+            f.write(line)
+        with open(index_path, "ab") as f:
+            f.write(INDEX_ENTRY.pack(stamp, offset))
+        return entry
+
+    @staticmethod
+    def _last_stamp(index_path: str) -> Optional[int]:
+        if not os.path.exists(index_path) or os.path.getsize(index_path) < INDEX_ENTRY.size:
+            return None
+        with open(index_path, "rb") as f:
+            f.seek(-INDEX_ENTRY.size, os.SEEK_END)
+            return INDEX_ENTRY.unpack(f.read(INDEX_ENTRY.size))[0]
+
+    # -----------------------------
+    # Чтение
+    # -----------------------------
+    def _open(self, user_id):
+        data_path, index_path = self._paths(user_id)
+        if not os.path.exists(index_path) or os.path.getsize(index_path) < INDEX_ENTRY.size:
+            return None
+        return data_path, index_path
+
+    @staticmethod
+    def _bisect(index: mmap.mmap, count: int, stamp: int) -> int:
+        """Число записей индекса со временем <= stamp"""
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if INDEX_ENTRY.unpack_from(index, mid * INDEX_ENTRY.size)[0] <= stamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def iter_backwards(self, user_id, start: Optional[datetime] = None,
+                       end: Optional[datetime] = None, before: Optional[int] = None
+                       ) -> Iterator[Tuple[int, dict]]:
+        """
+        Сделки от новых к старым в периоде [start, end] как (позиция, сделка).
+        before — позиция, с которой продолжать (курсор предыдущей страницы).
+        """
+        paths = self._open(user_id)
+        if paths is None:
+            return
+        data_path, index_path = paths
+        with open(index_path, "rb") as fi, open(data_path, "rb") as fd, \
+                mmap.mmap(fi.fileno(), 0, access=mmap.ACCESS_READ) as index:
+            count = len(index) // INDEX_ENTRY.size
+            hi = count if end is None else self._bisect(index, count, to_micros(end))
+            lo = 0 if start is None else self._bisect(index, count, to_micros(start) - 1)
+            if before is not None:
+                hi = min(hi, before)
+            for pos in range(hi - 1, lo - 1, -1):
+                _, offset = INDEX_ENTRY.unpack_from(index, pos * INDEX_ENTRY.size)
+                fd.seek(offset)
+                yield pos, json.loads(fd.readline())
+
+    def iter_forward(self, user_id, start: Optional[datetime] = None,
+                     end: Optional[datetime] = None) -> Iterator[dict]:
+        """Сделки от старых к новым в периоде [start, end], читаются построчно"""
+        paths = self._open(user_id)
+        if paths is None:
+            return
+        data_path, index_path = paths
+        with open(index_path, "rb") as fi, open(data_path, "rb") as fd, \
+                mmap.mmap(fi.fileno(), 0, access=mmap.ACCESS_READ) as index:
+            count = len(index) // INDEX_ENTRY.size
+            hi = count if end is None else self._bisect(index, count, to_micros(end))
+            lo = 0 if start is None else self._bisect(index, count, to_micros(start) - 1)
+            if lo >= hi:
+                return
+            fd.seek(INDEX_ENTRY.unpack_from(index, lo * INDEX_ENTRY.size)[1])
+            for _ in range(hi - lo):
+                yield json.loads(fd.readline())
+
+    def user_ids(self) -> List[int]:
+        """Пользователи, у которых есть журнал сделок"""
+        ids = []
+        for name in os.listdir(self.directory):
+            if name.startswith("user_") and name.endswith(".idx"):
+                try:
+                    ids.append(int(name[len("user_"):-len(".idx")]))
+                except ValueError:
+                    continue
+        return sorted(ids)
+
+    def query(self, user_id, currency: Optional[str] = None, start: Optional[datetime] = None,
+              end: Optional[datetime] = None, limit: int = 50,
+              cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        """Страница сделок (новые первыми) и курсор следующей страницы (None — конец)"""
+        if limit <= 0:
+            raise ValueError("Лимит должен быть положительным")
+        before = None
+        if cursor:
+            try:
+                before = int(cursor)
+            except ValueError:
+                raise ValueError(f"Некорректный курсор '{cursor}'")
+        items: List[dict] = []
+        last_pos = None
+        for pos, trade in self.iter_backwards(user_id, start, end, before):
+            if currency and trade.get("currency") != currency:
+                continue
+            if len(items) == limit:
+                return items, str(last_pos)
+            items.append(trade)
+            last_pos = pos
+        return items, None
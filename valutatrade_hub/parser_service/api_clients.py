@@ -124,6 +124,24 @@ class ExchangeRateAPI:
             print(f"❌ Неожиданная ошибка: {e}")
             return self._get_mock_rates()
     
+    def get_supported_codes(self) -> Dict[str, str]:
+        """
+        Получает список поддерживаемых провайдером валют: {код: название}
+        """
+        if not self.config.EXCHANGERATE_API_KEY:
+            return {}
+        url = f"{self.config.EXCHANGERATE_API_URL}/{self.config.EXCHANGERATE_API_KEY}/codes"
+        try:
+            response = requests.get(url, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            print(f"❌ Не удалось получить список валют: {e}")
+            return {}
+        if data.get('result') != 'success':
+            return {}
+        return {code: name for code, name in data.get('supported_codes', [])}
+    
     def _get_mock_rates(self) -> Dict[str, float]:
         """Возвращает тестовые данные для разработки"""
         print("⚠️ Используются тестовые данные")
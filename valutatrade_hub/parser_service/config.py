@@ -19,10 +19,25 @@ class ParserConfig:
     # Пути
     RATES_FILE_PATH: str = "data/rates.json"
     HISTORY_FILE_PATH: str = "data/exchange_rates.json"
+    SHARED_RATES_PATH: str = "data/rates.bin"
+    HISTORY_DIR: str = "data/history"
+    # Формат сегментов истории: json / msgpack (см. infra/serialization.py)
+    HISTORY_FORMAT: str = "json"
+
+    # Хранение истории: сырые снимки, затем почасовые, затем дневные
+    RAW_RETENTION_DAYS: int = 7
+    HOURLY_RETENTION_DAYS: int = 365
 
     # Сетевые параметры
     REQUEST_TIMEOUT: int = 10
 
+    # Потоковый режим: фид тиков (JSON Lines по TCP), окно объединения тиков
+    # и размер очереди, при заполнении которой чтение фида приостанавливается
+    STREAM_HOST: str = "127.0.0.1"
+    STREAM_PORT: int = 8765
+    STREAM_WINDOW_SECONDS: float = 1.0
+    STREAM_QUEUE_SIZE: int = 1000
+
     # Для возможной кастомизации (например, сопоставления тикеров, если понадобится)
     CUSTOM_CRYPTO_MAP: Dict[str, str] = field(default_factory=dict)
 
@@ -1,53 +1,338 @@
 # valutatrade_hub/parser_service/storage.py
+import gzip
 import json
+from contextlib import contextmanager
 from pathlib import Path
-from datetime import datetime, timezone
-from typing import Dict, Any
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 
 from .config import ParserConfig
+from valutatrade_hub.infra import serialization
+
+try:  # блокировки файлов (POSIX); без fcntl работаем без межпроцессных блокировок
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+RESOLUTION_RAW = "raw"
+RESOLUTION_HOURLY = "hourly"
+RESOLUTION_DAILY = "daily"
+
+
+def _parse_ts(value: str) -> datetime:
+    ts = datetime.fromisoformat(value)
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def _downsample(snapshots: Dict[str, Any], bucket_len: int) -> Dict[str, Any]:
+    """Оставляет последний снимок в каждом интервале (bucket_len — длина префикса ISO-времени)"""
+    kept: Dict[str, str] = {}
+    for ts in sorted(snapshots):
+        kept[_parse_ts(ts).isoformat()[:bucket_len]] = ts
+    return {ts: snapshots[ts] for ts in kept.values()}
 
 
 class RatesStorage:
-    """Класс для работы с историческими данными курсов"""
-    
+    """
+    Класс для работы с историческими данными курсов.
+
+    История разбита на дневные сегменты в HISTORY_DIR. Сегменты прошлых дней
+    запечатываются (gzip), а манифест хранит диапазон времени каждого сегмента,
+    чтобы запросы открывали только пересекающиеся с диапазоном файлы.
+    Политика хранения прореживает старые данные: сырые снимки — RAW_RETENTION_DAYS,
+    почасовые — HOURLY_RETENTION_DAYS, дальше один снимок в день (месячные сегменты).
+    """
+
     def __init__(self):
         self.config = ParserConfig()
         self.data_file = Path(self.config.HISTORY_FILE_PATH)
-        self.data_file.parent.mkdir(exist_ok=True)
-    
-    def save_rates(self, rates: Dict[str, Any]):
-        """
-        Сохраняет курсы валют с временной меткой
-        """
-        data = self._load_data()
-        
-        timestamp = datetime.now(timezone.utc).isoformat()
-        data[timestamp] = rates
-        
-        self._save_data(data)
-    
-    def _load_data(self) -> Dict[str, Any]:
-        """Загружает данные из файла"""
-        if not self.data_file.exists():
+        self.history_dir = Path(self.config.HISTORY_DIR)
+        self.history_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest_file = self.history_dir / "manifest.json"
+        self.lock_file = self.history_dir / ".lock"
+        self.manifest = self._load_manifest()
+        self._latest: Optional[Tuple[str, Dict[str, Any]]] = None  # (время, снимок) последней записи
+        if not self.manifest.get("legacy_imported"):
+            with self._locked():
+                if not self.manifest.get("legacy_imported"):
+                    self._import_legacy()
+
+    @contextmanager
+    def _locked(self):
+        """
+        Эксклюзивная блокировка каталога истории для записи сегментов и манифеста.
+        Манифест перечитывается под блокировкой: другой процесс мог изменить его
+        после того, как этот экземпляр его загрузил.
+        """
+        if fcntl is None:
+            self.manifest = self._load_manifest()
+            yield
+            return
+        with open(self.lock_file, "a+b") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                self.manifest = self._load_manifest()
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def save_rates(self, rates: Dict[str, Any], merge: bool = False):
+        """
+        Сохраняет курсы валют с временной меткой.
+
+        Снимок дописывается в конец открытого сегмента дня без перечитывания
+        файла; сегмент переписывается целиком только при смене дня (тогда же
+        запечатываются прошлые сегменты и применяется политика хранения).
+        С merge курсы накладываются на последний сохранённый снимок, в том числе
+        записанный другим процессом, — так поток тиков пишет полные снимки.
+        """
+        now = datetime.now(timezone.utc)
+        timestamp = now.isoformat()
+        name = now.strftime("%Y-%m-%d")
+
+        with self._locked():
+            if merge:
+                rates = {**self._latest_snapshot(), **rates}
+            self._latest = (timestamp, rates)
+            entry = self._segment(name)
+            if entry and self._append_to_open_segment(entry, timestamp, rates):
+                self._save_manifest()
+                return
+
+            data = self._read_segment(entry) if entry else {}
+            data[timestamp] = rates
+            self._write_segment(name, data, sealed=False, resolution=RESOLUTION_RAW)
+
+            self._seal_segments(before=name)
+            self.apply_retention(now)
+            self._save_manifest()
+
+    def _latest_snapshot(self) -> Dict[str, Any]:
+        """
+        Последний снимок истории. Запомненная собственная запись используется,
+        пока после неё никто не писал; иначе снимок читается из сегмента.
+        """
+        end = max((s["end"] for s in self.manifest["segments"]), key=_parse_ts, default=None)
+        if self._latest is not None and self._latest[0] == end:
+            return self._latest[1]
+        return self.get_latest_rates()
+
+    def _append_to_open_segment(self, entry: Dict[str, Any], timestamp: str,
+                                rates: Dict[str, Any]) -> bool:
+        """Дописывает пару "время": курсы перед закрывающей скобкой JSON-сегмента"""
+        path = self._segment_path(entry["name"], False)
+        if entry["sealed"] or serialization.file_format(str(path)) != "json":
+            return False
+        with open(path, "r+b") as f:
+            pos = f.seek(0, 2)
+            char = b""
+            while pos > 0:
+                f.seek(pos - 1)
+                char = f.read(1)
+                if not char.isspace():
+                    break
+                pos -= 1
+            if char != b"}" or pos <= 2:
+                return False
+            f.seek(pos - 1)
+            f.write(b"," + json.dumps(timestamp).encode("utf-8") + b":"
+                    + serialization.dumps(rates, "json") + b"}")
+            f.truncate()
+        if _parse_ts(timestamp) >= _parse_ts(entry["end"]):
+            entry["end"] = timestamp
+        entry["count"] += 1
+        return True
+
+    # -----------------------------
+    # Манифест и сегменты
+    # -----------------------------
+    def _load_manifest(self) -> Dict[str, Any]:
+        return serialization.load(str(self.manifest_file), {"segments": [], "legacy_imported": False})
+
+    def _save_manifest(self):
+        self.manifest["segments"].sort(key=lambda s: s["start"])
+        serialization.dump(str(self.manifest_file), self.manifest)
+
+    def _segment(self, name: str) -> Optional[Dict[str, Any]]:
+        return next((s for s in self.manifest["segments"] if s["name"] == name), None)
+
+    def _segment_path(self, name: str, sealed: bool) -> Path:
+        return self.history_dir / (f"{name}.json.gz" if sealed else f"{name}.json")
+
+    def _read_segment(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        path = self._segment_path(entry["name"], entry["sealed"])
+        if not path.exists():
             return {}
-        
-        with open(self.data_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    
-    def _save_data(self, data: Dict[str, Any]):
-        """Сохраняет данные в файл"""
-        with open(self.data_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-    
-    def get_latest_rates(self) -> Dict[str, Any]:
-        """Возвращает последние сохраненные курсы"""
-        data = self._load_data()
+        raw = path.read_bytes()
+        return serialization.loads(gzip.decompress(raw) if entry["sealed"] else raw)
+
+    def _write_segment(self, name: str, data: Dict[str, Any], sealed: bool, resolution: str):
+        old = self._segment(name)
         if not data:
-            return {}
-        
-        latest_timestamp = sorted(data.keys())[-1]
-        return data[latest_timestamp]
+            if old:
+                self._drop_segment(old)
+            return
+        path = self._segment_path(name, sealed)
+        raw = serialization.dumps(data, self.manifest.get("format", self.config.HISTORY_FORMAT))
+        if sealed:
+            raw = gzip.compress(raw)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_bytes(raw)
+        tmp.replace(path)
+
+        if old and old["sealed"] != sealed:
+            self._segment_path(name, old["sealed"]).unlink(missing_ok=True)
+        keys = sorted(data, key=_parse_ts)
+        entry = {
+            "name": name,
+            "start": keys[0],
+            "end": keys[-1],
+            "count": len(data),
+            "sealed": sealed,
+            "resolution": resolution,
+        }
+        if old:
+            old.update(entry)
+        else:
+            self.manifest["segments"].append(entry)
+
+    def _drop_segment(self, entry: Dict[str, Any]):
+        self._segment_path(entry["name"], entry["sealed"]).unlink(missing_ok=True)
+        self.manifest["segments"].remove(entry)
+
+    def _seal_segments(self, before: str):
+        """Сжимает открытые сегменты за прошедшие дни"""
+        for entry in list(self.manifest["segments"]):
+            if not entry["sealed"] and entry["name"] < before:
+                data = self._read_segment(entry)
+                self._write_segment(entry["name"], data, sealed=True, resolution=entry["resolution"])
+
+    def _import_legacy(self):
+        """Разносит старый exchange_rates.json по дневным сегментам (файл не изменяется)"""
+        if self.data_file.exists():
+            legacy = serialization.load(str(self.data_file), {})
+            by_day: Dict[str, Dict[str, Any]] = {}
+            for key, rates in legacy.items():
+                if not isinstance(rates, dict):
+                    continue
+                try:
+                    day = _parse_ts(key).strftime("%Y-%m-%d")
+                except ValueError:
+                    continue  # служебные ключи ("rates", "last_update")
+                by_day.setdefault(day, {})[key] = rates
+            today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+            for day, snapshots in by_day.items():
+                entry = self._segment(day)
+                if entry:
+                    snapshots = {**snapshots, **self._read_segment(entry)}
+                self._write_segment(day, snapshots, sealed=day < today, resolution=RESOLUTION_RAW)
+        self.manifest["legacy_imported"] = True
+        self._save_manifest()
+
+    def convert_format(self, fmt: str) -> List[Tuple[str, int, int]]:
+        """
+        Переписывает все сегменты и манифест в формате fmt и запоминает его
+        в манифесте для последующих записей. Возвращает (путь, размер до, после).
+        """
+        with self._locked():
+            self.manifest["format"] = fmt
+            results = []
+            for entry in list(self.manifest["segments"]):
+                path = self._segment_path(entry["name"], entry["sealed"])
+                before = path.stat().st_size if path.exists() else 0
+                self._write_segment(entry["name"], self._read_segment(entry), entry["sealed"], entry["resolution"])
+                if path.exists():
+                    results.append((str(path), before, path.stat().st_size))
+            before = self.manifest_file.stat().st_size if self.manifest_file.exists() else 0
+            self.manifest["segments"].sort(key=lambda s: s["start"])
+            serialization.dump(str(self.manifest_file), self.manifest, fmt)
+            results.append((str(self.manifest_file), before, self.manifest_file.stat().st_size))
+        return results
+
+    # -----------------------------
+    # Политика хранения
+    # -----------------------------
+    def apply_retention(self, now: Optional[datetime] = None):
+        """
+        Прореживает запечатанные сегменты: старше RAW_RETENTION_DAYS — до одного
+        снимка в час, старше HOURLY_RETENTION_DAYS — до одного в день с переносом
+        в месячный сегмент.
+        """
+        now = now or datetime.now(timezone.utc)
+        raw_cutoff = (now - timedelta(days=self.config.RAW_RETENTION_DAYS)).strftime("%Y-%m-%d")
+        hourly_cutoff = (now - timedelta(days=self.config.HOURLY_RETENTION_DAYS)).strftime("%Y-%m-%d")
 
+        for entry in list(self.manifest["segments"]):
+            if not entry["sealed"] or entry["resolution"] == RESOLUTION_DAILY:
+                continue
+            name = entry["name"]
+            if name < hourly_cutoff:
+                daily = _downsample(self._read_segment(entry), len("YYYY-MM-DD"))
+                month = self._segment(name[:7])
+                if month:
+                    daily = {**self._read_segment(month), **daily}
+                self._drop_segment(entry)
+                self._write_segment(name[:7], daily, sealed=True, resolution=RESOLUTION_DAILY)
+            elif name < raw_cutoff and entry["resolution"] == RESOLUTION_RAW:
+                hourly = _downsample(self._read_segment(entry), len("YYYY-MM-DDTHH"))
+                self._write_segment(name, hourly, sealed=True, resolution=RESOLUTION_HOURLY)
 
+    # -----------------------------
+    # Запросы
+    # -----------------------------
+    def get_range(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                  include_previous: bool = False) -> Dict[str, Any]:
+        """
+        Снимки в диапазоне [start, end]; открываются только пересекающиеся сегменты.
+        include_previous добавляет последний снимок до start (курс, действовавший на start).
+        """
+        result: Dict[str, Any] = {}
+        segments = sorted(self.manifest["segments"], key=lambda s: _parse_ts(s["start"]))
+        if start and include_previous:
+            previous = [s for s in segments if _parse_ts(s["start"]) < start]
+            if previous and _parse_ts(previous[-1]["end"]) < start:
+                entry = previous[-1]
+                result[entry["end"]] = self._read_segment(entry)[entry["end"]]
+            elif previous:
+                data = self._read_segment(previous[-1])
+                before = [ts for ts in data if _parse_ts(ts) < start]
+                if before:
+                    last = max(before, key=_parse_ts)
+                    result[last] = data[last]
+        for entry in segments:
+            if start and _parse_ts(entry["end"]) < start:
+                continue
+            if end and _parse_ts(entry["start"]) > end:
+                continue
+            for ts, rates in self._read_segment(entry).items():
+                moment = _parse_ts(ts)
+                if (start is None or moment >= start) and (end is None or moment <= end):
+                    result[ts] = rates
+        return result
 
+    def iter_range(self, start: Optional[datetime] = None,
+                   end: Optional[datetime] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Потоково выдаёт снимки (время, курсы) в диапазоне [start, end]:
+        сегменты читаются по одному и разбираются инкрементально.
+        """
+        segments = sorted(self.manifest["segments"], key=lambda s: _parse_ts(s["start"]))
+        for entry in segments:
+            if start and _parse_ts(entry["end"]) < start:
+                continue
+            if end and _parse_ts(entry["start"]) > end:
+                break
+            path = self._segment_path(entry["name"], entry["sealed"])
+            for ts, rates in serialization.iter_items(str(path)):
+                moment = _parse_ts(ts)
+                if (start is None or moment >= start) and (end is None or moment <= end):
+                    yield ts, rates
 
+    def get_latest_rates(self) -> Dict[str, Any]:
+        """Возвращает последние сохраненные курсы"""
+        if not self.manifest["segments"]:
+            return {}
+        latest = max(self.manifest["segments"], key=lambda s: _parse_ts(s["end"]))
+        data = self._read_segment(latest)
+        return data[latest["end"]] if data else {}
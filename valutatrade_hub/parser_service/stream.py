@@ -0,0 +1,214 @@
+# valutatrade_hub/parser_service/stream.py
+import asyncio
+import json
+import math
+import random
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from .config import ParserConfig
+from .updater import RatesUpdater
+
+
+def parse_tick(line: bytes, base_currency: str) -> Optional[Tuple[str, float]]:
+    """
+    Разбирает тик фида (одна JSON-строка) в (валюта, 1 BASE = rate).
+
+    Поддерживаются {"currency": "BTC", "rate": 1.6e-05} в соглашении
+    провайдера и {"pair": "BTC_USD", "rate": 62500.0} для любой пары с BASE.
+    Некорректные строки пропускаются.
+    """
+    try:
+        tick = json.loads(line)
+        rate = float(tick["rate"])
+        if "pair" in tick:
+            left, right = tick["pair"].upper().split("_")
+            if left == base_currency:
+                currency = right
+            elif right == base_currency:
+                currency, rate = left, 1 / rate
+            else:
+                return None
+        else:
+            currency = tick["currency"].upper()
+    except (ValueError, KeyError, TypeError, AttributeError, ZeroDivisionError):
+        return None
+    return (currency, rate) if math.isfinite(rate) and rate > 0 else None
+
+
+@dataclass
+class StreamStats:
+    received: int = 0
+    skipped: int = 0
+    applied: int = 0
+    flushes: int = 0
+    max_queue: int = 0
+
+    @property
+    def coalesced(self) -> int:
+        """Тики, поглощённые более свежими тиками той же валюты в окне"""
+        return self.received - self.skipped - self.applied
+
+
+class TickStreamIngestor:
+    """
+    Потоковое обновление курсов из фида тиков (JSON Lines по TCP).
+
+    Чтение фида и применение курсов разделены ограниченной очередью:
+    если запись на диск не успевает, очередь заполняется и чтение из
+    сокета приостанавливается (backpressure через TCP). Тики за окно
+    window_seconds объединяются — по каждой валюте применяется только
+    последний курс, поэтому файлы обновляются не чаще раза в окно.
+    """
+
+    def __init__(self, updater: Optional[RatesUpdater] = None, host: Optional[str] = None,
+                 port: Optional[int] = None, window_seconds: Optional[float] = None,
+                 queue_size: Optional[int] = None):
+        self.config = ParserConfig()
+        self.updater = updater or RatesUpdater(source="stream")
+        self.host = host or self.config.STREAM_HOST
+        self.port = port or self.config.STREAM_PORT
+        self.window = self.config.STREAM_WINDOW_SECONDS if window_seconds is None else window_seconds
+        if self.window <= 0:
+            raise ValueError("Окно объединения тиков должно быть положительным")
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size or self.config.STREAM_QUEUE_SIZE)
+        self.stats = StreamStats()
+
+    async def _read_feed(self, reader: asyncio.StreamReader):
+        base_currency = self.config.BASE_CURRENCY
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            self.stats.received += 1
+            tick = parse_tick(line, base_currency)
+            if tick is None:
+                self.stats.skipped += 1
+                continue
+            await self.queue.put(tick)  # ждёт, пока потребитель не освободит место
+            self.stats.max_queue = max(self.stats.max_queue, self.queue.qsize())
+
+    async def _flush(self, pending: Dict[str, float]):
+        applied = await asyncio.to_thread(self.updater.apply_ticks, dict(pending))
+        self.stats.applied += len(pending)
+        self.stats.flushes += 1 if applied else 0
+        pending.clear()
+
+    async def _coalesce(self):
+        loop = asyncio.get_running_loop()
+        pending: Dict[str, float] = {}
+        deadline = loop.time() + self.window
+        while True:
+            timeout = deadline - loop.time()
+            try:
+                if timeout > 0:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                else:  # окно истекло (например, во время долгого сброса): забираем готовое
+                    item = self.queue.get_nowait()
+            except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                item = ()
+            if item is None:
+                break
+            if item:
+                currency, rate = item
+                pending[currency] = rate
+            if loop.time() >= deadline:
+                if pending:
+                    await self._flush(pending)
+                deadline = loop.time() + self.window
+        if pending:
+            await self._flush(pending)
+
+    async def run(self, duration: Optional[float] = None) -> StreamStats:
+        """Читает фид до его закрытия или истечения duration секунд"""
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        feed = asyncio.create_task(self._read_feed(reader))
+        consumer = asyncio.create_task(self._coalesce())
+        try:
+            # Потребитель завершается раньше фида только при ошибке применения курсов
+            await asyncio.wait({feed, consumer}, timeout=duration,
+                               return_when=asyncio.FIRST_COMPLETED)
+            feed.cancel()
+            feed_error = (await asyncio.gather(feed, return_exceptions=True))[0]
+            await self._stop_consumer(consumer)
+            if isinstance(feed_error, Exception):
+                raise feed_error
+        finally:
+            writer.close()
+            feed.cancel()
+            consumer.cancel()
+        return self.stats
+
+    async def _stop_consumer(self, consumer: asyncio.Task):
+        """Просит потребителя применить остаток и завершиться; пробрасывает его ошибку"""
+        stop = asyncio.create_task(self.queue.put(None))
+        await asyncio.wait({stop, consumer}, return_when=asyncio.FIRST_COMPLETED)
+        stop.cancel()
+        await consumer
+
+
+class StubTickFeed:
+    """
+    Тестовый фид тиков: случайное блуждание заданных курсов (по умолчанию
+    BTC/ETH/SOL), по JSON-строке на тик каждому клиенту.
+    """
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None, host: Optional[str] = None,
+                 port: Optional[int] = None, ticks_per_second: float = 50.0,
+                 max_ticks: Optional[int] = None):
+        config = ParserConfig()
+        self.base_currency = config.BASE_CURRENCY
+        self.rates = dict(rates or {"BTC": 1 / 62500, "ETH": 1 / 3100, "SOL": 1 / 145})
+        self.host = host or config.STREAM_HOST
+        self.port = port if port is not None else config.STREAM_PORT
+        self.interval = 1 / ticks_per_second
+        self.max_ticks = max_ticks
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        rates = dict(self.rates)
+        sent = 0
+        try:
+            while self.max_ticks is None or sent < self.max_ticks:
+                currency = random.choice(list(rates))
+                rates[currency] *= 1 + random.gauss(0, 0.0005)
+                tick = {"pair": f"{currency}_{self.base_currency}", "rate": 1 / rates[currency]}
+                writer.write((json.dumps(tick) + "\n").encode("utf-8"))
+                await writer.drain()  # медленный клиент притормаживает фид
+                sent += 1
+                if self.interval:
+                    await asyncio.sleep(self.interval)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> int:
+        """Запускает сервер; возвращает фактический порт (полезно при port=0)"""
+        self._server = await asyncio.start_server(self._serve_client, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+
+async def _run_with_stub(ingestor: TickStreamIngestor, duration: Optional[float]) -> StreamStats:
+    feed = StubTickFeed(host=ingestor.host, port=0)
+    ingestor.port = await feed.start()
+    try:
+        return await ingestor.run(duration)
+    finally:
+        await feed.stop()
+
+
+def stream_rates(host: Optional[str] = None, port: Optional[int] = None,
+                 window_seconds: Optional[float] = None, duration: Optional[float] = None,
+                 stub: bool = False) -> StreamStats:
+    """Синхронная точка входа: потоковое обновление курсов (stub — со встроенным тестовым фидом)"""
+    ingestor = TickStreamIngestor(host=host, port=port, window_seconds=window_seconds)
+    if stub:
+        return asyncio.run(_run_with_stub(ingestor, duration))
+    return asyncio.run(ingestor.run(duration))
@@ -1,13 +1,22 @@
 # valutatrade_hub/parser_service/updater.py
-import json
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime, timezone
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, Optional
 
 from .api_clients import ExchangeRateAPI
 from .storage import RatesStorage
 from .config import ParserConfig
+from valutatrade_hub.core.alerts import AlertsEngine
+from valutatrade_hub.core.currencies import CurrencyRegistry
 from valutatrade_hub.core.exceptions import ApiRequestError
+from valutatrade_hub.infra import serialization
+from valutatrade_hub.infra.shared_rates import SharedRatesWriter
+
+try:  # блокировки файлов (POSIX); без fcntl работаем без межпроцессных блокировок
+    import fcntl
+except ImportError:
+    fcntl = None
 
 
 class RatesUpdater:
@@ -18,6 +27,8 @@ class RatesUpdater:
         self.source = source or "exchangerate-api"
         self.api_client = ExchangeRateAPI()
         self.storage = RatesStorage()
+        self.rates_data: Dict[str, Any] = {}
+        self._alerts: Optional[AlertsEngine] = None
         
     def run_update(self) -> int:
         """
@@ -33,11 +44,24 @@ class RatesUpdater:
                 print("⚠️ Не получены данные от API")
                 return 0
             
-            # Обновляем локальный кэш (rates.json)
-            updated_count = self._update_rates_cache(fresh_rates)
-            
+            # Дополняем реестр валют кодами провайдера
+            self._sync_currency_registry(fresh_rates)
+
+            with self._rates_lock():
+                # Запоминаем предыдущие курсы для проверки оповещений
+                previous_pairs = self._load_cached_pairs()
+
+                # Обновляем локальный кэш (rates.json)
+                updated_count = self._update_rates_cache(fresh_rates)
+
+                # Публикуем бинарную таблицу курсов для других процессов (rates.bin)
+                self._publish_shared_rates()
+
             # Сохраняем исторические данные (exchange_rates.json)
             self._save_historical_data(fresh_rates)
+
+            # Проверяем пересечённые уровни оповещений
+            self._check_alerts(previous_pairs)
             
             print(f"✅ Обновлено {updated_count} курсов валют")
             return updated_count
@@ -46,6 +70,97 @@ class RatesUpdater:
             print(f"❌ Ошибка при обновлении курсов: {e}")
             raise ApiRequestError(f"Ошибка API: {e}")
     
+    def _sync_currency_registry(self, fresh_rates: Dict[str, Any]):
+        """
+        Добавляет в реестр валют коды, которых в нём ещё нет.
+        Названия запрашиваются у провайдера только при появлении новых кодов.
+        """
+        try:
+            registry = CurrencyRegistry()
+            unknown = [code for code in fresh_rates if code not in registry]
+            if not unknown:
+                return
+            names = self.api_client.get_supported_codes()
+            added = registry.sync(unknown, names=names, crypto=self.config.CRYPTO_CURRENCIES)
+            if added:
+                print(f"🪙 В реестр добавлено валют: {added}")
+        except Exception as e:
+            print(f"⚠️ Не удалось обновить реестр валют: {e}")
+
+    @contextmanager
+    def _rates_lock(self):
+        """
+        Эксклюзивная блокировка записи rates.json и rates.bin: обновление по API
+        и потоки тиков из разных процессов не затирают пары друг друга
+        """
+        if fcntl is None:
+            yield
+            return
+        lock_path = Path(f"{self.config.RATES_FILE_PATH}.lock")
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(lock_path, "a+b") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _load_cached_pairs(self) -> Dict[str, Any]:
+        """Читает текущие пары из rates.json (до перезаписи)"""
+        rates_file = Path(self.config.RATES_FILE_PATH)
+        if not rates_file.exists():
+            return {}
+        try:
+            return serialization.load(str(rates_file), {}).get("pairs", {})
+        except (OSError, ValueError):
+            return {}
+
+    def apply_ticks(self, ticks: Dict[str, float]) -> int:
+        """
+        Инкрементально применяет курсы из потока тиков (валюта -> 1 BASE = rate).
+        Под блокировкой rates.json перечитывается и в нём меняются только
+        затронутые пары (и слоты rates.bin), поэтому записи других процессов
+        не теряются. В историю дописывается полный снимок курсов (последний
+        снимок с наложенными курсами rates.json), чтобы срезы истории видели
+        все валюты. Возвращает число валют.
+        """
+        registry = CurrencyRegistry()
+        base_currency = self.config.BASE_CURRENCY
+        changed = {
+            code: rate for code, rate in ticks.items()
+            if code in registry and code != base_currency and rate > 0
+        }
+        if not changed:
+            return 0
+
+        with self._rates_lock():
+            pairs = self._load_cached_pairs()
+            previous_pairs = dict(pairs)
+            refreshed_at = datetime.now(timezone.utc).isoformat()
+            for currency, rate in changed.items():
+                pairs.update(self._pair_entries(currency, rate, refreshed_at, "stream"))
+            self.rates_data = {"pairs": pairs, "last_refresh": refreshed_at}
+            serialization.dump(self.config.RATES_FILE_PATH, self.rates_data)
+            self._publish_shared_rates(changed)
+
+        prefix = f"{base_currency}_"
+        snapshot = {key[len(prefix):]: pair["rate"] for key, pair in pairs.items() if key.startswith(prefix)}
+        self._save_historical_data(snapshot, merge=True)
+        self._check_alerts(previous_pairs)
+        return len(changed)
+
+    def _pair_entries(self, currency: str, rate: float, updated_at: str, source: str) -> Dict[str, Any]:
+        """Прямая (BASE -> валюта) и обратная пары для rates.json"""
+        base_currency = self.config.BASE_CURRENCY
+        entries = {
+            f"{base_currency}_{currency}": {"rate": rate, "updated_at": updated_at, "source": source}
+        }
+        if rate != 0:
+            entries[f"{currency}_{base_currency}"] = {
+                "rate": 1 / rate, "updated_at": updated_at, "source": source
+            }
+        return entries
+
     def _update_rates_cache(self, fresh_rates: Dict[str, Any]) -> int:
         """
         Обновляет файл rates.json (локальный кэш для Core Service)
@@ -66,42 +181,72 @@ class RatesUpdater:
         
         for currency, rate in fresh_rates.items():
             if currency in target_currencies and currency != base_currency:
-                # Прямая пара: BASE -> Currency
-                pair_key = f"{base_currency}_{currency}"
-                rates_data["pairs"][pair_key] = {
-                    "rate": rate,
-                    "updated_at": rates_data["last_refresh"],
-                    "source": "ExchangeRate-API"
-                }
-                updated_count += 1
-                
-                # Обратная пара: Currency -> BASE
-                if rate != 0:
-                    pair_key = f"{currency}_{base_currency}"
-                    rates_data["pairs"][pair_key] = {
-                        "rate": 1 / rate,
-                        "updated_at": rates_data["last_refresh"],
-                        "source": "ExchangeRate-API"
-                    }
-                    updated_count += 1
+                # Прямая пара BASE -> Currency и обратная Currency -> BASE
+                entries = self._pair_entries(currency, rate, rates_data["last_refresh"], "ExchangeRate-API")
+                rates_data["pairs"].update(entries)
+                updated_count += len(entries)
         
         # Сохраняем в файл
-        with open(rates_file, 'w', encoding='utf-8') as f:
-            json.dump(rates_data, f, indent=2, ensure_ascii=False)
-        
+        serialization.dump(str(rates_file), rates_data)
+
+        self.rates_data = rates_data
         return updated_count
     
-    def _save_historical_data(self, fresh_rates: Dict[str, Any]):
+    def _publish_shared_rates(self, only: Optional[Iterable[str]] = None):
+        """
+        Публикует прямые курсы BASE -> валюта в memory-mapped таблицу
+        (only — обновить лишь слоты перечисленных валют)
+        """
+        try:
+            base_currency = self.config.BASE_CURRENCY
+            prefix = f"{base_currency}_"
+            rates = [(base_currency, 1.0)]
+            rates.extend(
+                (key[len(prefix):], pair["rate"])
+                for key, pair in self.rates_data["pairs"].items()
+                if key.startswith(prefix)
+            )
+            if only is not None:
+                only = set(only)
+                rates = [(code, rate) for code, rate in rates if code in only]
+            refreshed_at = datetime.fromisoformat(self.rates_data["last_refresh"])
+            registry = CurrencyRegistry()
+            rates = [(code, rate) for code, rate in rates if code in registry]
+            SharedRatesWriter(self.config.SHARED_RATES_PATH).publish(
+                rates, refreshed_at, index_of=registry.index_of
+            )
+        except Exception as e:
+            print(f"⚠️ Не удалось опубликовать таблицу курсов: {e}")
+            # Устаревшая таблица не должна перекрывать свежий rates.json
+            try:
+                SharedRatesWriter(self.config.SHARED_RATES_PATH).invalidate()
+            except Exception as err:
+                print(f"⚠️ Не удалось сбросить таблицу курсов: {err}")
+
+    def _save_historical_data(self, fresh_rates: Dict[str, Any], merge: bool = False):
         """
         Сохраняет исторические данные в exchange_rates.json
         """
         try:
-            self.storage.save_rates(fresh_rates)
+            self.storage.save_rates(fresh_rates, merge=merge)
         except Exception as e:
             print(f"⚠️ Не удалось сохранить исторические данные: {e}")
 
-
-
-
-
-
+    def _check_alerts(self, previous_pairs: Dict[str, Any]):
+        """
+        Передаёт старые и новые курсы движку оповещений
+        """
+        try:
+            if self._alerts is None:
+                self._alerts = AlertsEngine()
+            else:
+                self._alerts.reload_if_changed()
+            events = self._alerts.process_update(
+                previous_pairs,
+                self.rates_data.get("pairs", {}),
+                self.rates_data.get("last_refresh"),
+            )
+            if events:
+                print(f"🔔 Сработало оповещений: {len(events)}")
+        except Exception as e:
+            print(f"⚠️ Не удалось проверить оповещения: {e}")